@@ -1,6 +1,27 @@
+import os
 import sys
+import mmap
+import ctypes
+import glob
+import time
+import struct
+from array import array
 from collections import defaultdict
-from typing import Sequence
+from typing import Sequence, Optional, Tuple, Union, Iterable, Iterator
+from multiprocessing import Pool, cpu_count
+
+# Checkpoint header: magic, turn, last spoken, number of table entries stored
+CHECKPOINT_HEADER = struct.Struct("<4sQQQ")
+CHECKPOINT_MAGIC = b"D15C"
+# A checkpoint stores the table up to its turn, about 4 * turn bytes, so a 30M turn game
+# keeping one every interval would take ~1.9 GB. Older checkpoints are thinned to a ladder
+# of every CHECKPOINT_LADDER-th one (~0.5 GB for 30M turns), the newest is always kept.
+CHECKPOINT_INTERVAL = 1_000_000
+CHECKPOINT_LADDER = 5
+
+# Per worker process state for run_many_seeds, allocated once by init_seed_worker
+_worker_last_seen = array("I")
+_worker_used = 0
 
 
 def counting_game(starting_numbers: Sequence[int], stop_turn) -> int:
@@ -37,8 +58,209 @@ def counting_game(starting_numbers: Sequence[int], stop_turn) -> int:
     return answer
 
 
+def table_size(starting_numbers: Sequence[int], stop_turn: int) -> int:
+    """Return how many last seen entries a game up to stop_turn can touch.
+
+    Every spoken number is either a starting number or the gap between two turns, so it is always below stop_turn.
+    """
+    return max(stop_turn, max(starting_numbers) + 1)
+
+
+def seed_game(starting_numbers: Sequence[int], last_seen: array) -> Tuple[int, int]:
+    """Load the starting numbers into last_seen and return the (turn, last_spoken) state.
+
+    last_seen holds the turn each number was last spoken on (0 for never), excluding the most recently spoken number.
+    """
+    for turn, num in enumerate(starting_numbers[:-1], start=1):
+        last_seen[num] = turn
+
+    return len(starting_numbers), starting_numbers[-1]
+
+
+def play_turns(last_seen: array, turn: int, last_spoken: int, stop_turn: int) -> int:
+    """Play from turn until stop_turn and return the number spoken on stop_turn."""
+    for turn in range(turn, stop_turn):
+        prev_turn = last_seen[last_spoken]
+        last_seen[last_spoken] = turn
+        last_spoken = turn - prev_turn if prev_turn else 0
+
+    return last_spoken
+
+
+def checkpoint_path(
+    checkpoint_dir: str, starting_numbers: Sequence[int], turn: Union[int, str]
+) -> str:
+    """Return the checkpoint file name for the given seed and turn."""
+    seed = "-".join(str(num) for num in starting_numbers)
+    return os.path.join(checkpoint_dir, f"{seed}.{turn}.ckpt")
+
+
+def save_checkpoint(
+    path: str,
+    starting_numbers: Sequence[int],
+    last_seen: array,
+    turn: int,
+    last_spoken: int,
+):
+    """Write the game state to a memory mapped checkpoint file."""
+    entries = min(len(last_seen), table_size(starting_numbers, turn))
+    table = memoryview(last_seen)[:entries].cast("B")
+    size = CHECKPOINT_HEADER.size + len(table)
+
+    # Write to a temporary file first so an interrupted save never leaves a torn checkpoint behind
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w+b") as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as mm:
+            CHECKPOINT_HEADER.pack_into(
+                mm, 0, CHECKPOINT_MAGIC, turn, last_spoken, entries
+            )
+            mm[CHECKPOINT_HEADER.size :] = table
+            mm.flush()
+
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str, size: int) -> Tuple[int, int, array]:
+    """Return the (turn, last_spoken, last_seen) state stored in path with last_seen grown to size entries."""
+    last_seen = array("I", bytes(4 * size))
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, turn, last_spoken, entries = CHECKPOINT_HEADER.unpack_from(mm, 0)
+            if magic != CHECKPOINT_MAGIC:
+                raise ValueError(f"{path} is not a day 15 checkpoint")
+
+            start = CHECKPOINT_HEADER.size
+            memoryview(last_seen).cast("B")[: 4 * entries] = mm[
+                start : start + 4 * entries
+            ]
+
+    return turn, last_spoken, last_seen
+
+
+def nearest_checkpoint(
+    checkpoint_dir: str, starting_numbers: Sequence[int], stop_turn: int
+) -> Optional[str]:
+    """Return the checkpoint with the highest turn at or below stop_turn for this seed, if any."""
+    best_turn, best_path = 0, None
+
+    for path in glob.glob(checkpoint_path(checkpoint_dir, starting_numbers, "*")):
+        turn = int(path.rsplit(".", 2)[1])
+        if best_turn < turn <= stop_turn:
+            best_turn, best_path = turn, path
+
+    return best_path
+
+
+def prune_checkpoints(
+    checkpoint_dir: str, starting_numbers: Sequence[int], turn: int, spacing: int
+):
+    """Delete the checkpoints below turn for this seed that aren't on a multiple of spacing.
+
+    Every stop turn still finds a checkpoint at most spacing turns behind it.
+    """
+    for path in glob.glob(checkpoint_path(checkpoint_dir, starting_numbers, "*")):
+        checkpoint_turn = int(path.rsplit(".", 2)[1])
+        if checkpoint_turn < turn and checkpoint_turn % spacing:
+            os.remove(path)
+
+
+def checkpointed_counting_game(
+    starting_numbers: Sequence[int],
+    stop_turn: int,
+    checkpoint_dir: str,
+    interval: int = CHECKPOINT_INTERVAL,
+    ladder: int = CHECKPOINT_LADDER,
+) -> int:
+    """Play the counting game, resuming from and saving checkpoints every interval turns in checkpoint_dir.
+
+    Older checkpoints are thinned to every ladder-th one, ladder=1 keeps them all.
+    """
+    if stop_turn <= len(starting_numbers):
+        return starting_numbers[stop_turn - 1]
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    size = table_size(starting_numbers, stop_turn)
+
+    path = nearest_checkpoint(checkpoint_dir, starting_numbers, stop_turn)
+    if path:
+        turn, last_spoken, last_seen = load_checkpoint(path, size)
+    else:
+        last_seen = array("I", bytes(4 * size))
+        turn, last_spoken = seed_game(starting_numbers, last_seen)
+
+    while turn < stop_turn:
+        next_turn = min(stop_turn, (turn // interval + 1) * interval)
+        last_spoken = play_turns(last_seen, turn, last_spoken, next_turn)
+        turn = next_turn
+
+        if turn % interval == 0:
+            path = checkpoint_path(checkpoint_dir, starting_numbers, turn)
+            save_checkpoint(path, starting_numbers, last_seen, turn, last_spoken)
+            if ladder > 1:
+                prune_checkpoints(
+                    checkpoint_dir, starting_numbers, turn, interval * ladder
+                )
+
+    return last_spoken
+
+
+def init_seed_worker(size: int):
+    """Preallocate the last seen buffer this worker process reuses for every seed."""
+    global _worker_last_seen, _worker_used
+    _worker_last_seen = array("I", bytes(4 * size))
+    _worker_used = 0
+
+
+def play_seed(
+    starting_numbers: Tuple[int, ...], stop_turn: int
+) -> Tuple[Tuple[int, ...], int, float]:
+    """Play one seed on the worker's shared buffer and return (seed, answer, elapsed seconds)."""
+    global _worker_used
+    start_time = time.time()
+
+    if stop_turn <= len(starting_numbers):
+        return starting_numbers, starting_numbers[stop_turn - 1], 0.0
+
+    # Only clear the part of the buffer the previous seed could have touched
+    address, _ = _worker_last_seen.buffer_info()
+    ctypes.memset(address, 0, _worker_last_seen.itemsize * _worker_used)
+    _worker_used = table_size(starting_numbers, stop_turn)
+
+    turn, last_spoken = seed_game(starting_numbers, _worker_last_seen)
+    answer = play_turns(_worker_last_seen, turn, last_spoken, stop_turn)
+
+    return starting_numbers, answer, time.time() - start_time
+
+
+def play_seed_args(args: Tuple[Tuple[int, ...], int]):
+    """Unpack the (seed, stop_turn) pairs handed out by imap_unordered."""
+    return play_seed(*args)
+
+
+def run_many_seeds(
+    seeds: Iterable[Sequence[int]], stop_turn: int, processes: Optional[int] = None
+) -> Iterator[Tuple[Tuple[int, ...], int, float]]:
+    """Play every seed across a process pool and yield (seed, answer, elapsed seconds) as each game finishes."""
+    seeds = [tuple(seed) for seed in seeds]
+    if not seeds:
+        return
+
+    size = max(table_size(seed, stop_turn) for seed in seeds)
+
+    with Pool(
+        processes or cpu_count(), initializer=init_seed_worker, initargs=(size,)
+    ) as pool:
+        yield from pool.imap_unordered(
+            play_seed_args, ((seed, stop_turn) for seed in seeds)
+        )
+
+
 if __name__ == "__main__":
     filename = sys.argv[1]
+    # Optionally share work between runs by checkpointing to the given directory
+    checkpoint_dir = sys.argv[2] if len(sys.argv) > 2 else None
 
     numbers = [int(num) for num in open(filename).read().split(",")]
 
@@ -55,5 +277,8 @@ if __name__ == "__main__":
     answer = counting_game(numbers, 2020)
     print(f"Part 1: {answer}")
 
-    answer = counting_game(numbers, 30000000)
+    if checkpoint_dir:
+        answer = checkpointed_counting_game(numbers, 30000000, checkpoint_dir)
+    else:
+        answer = counting_game(numbers, 30000000)
     print(f"Part 2: {answer}")
@@ -1,7 +1,21 @@
 import sys
-from typing import NamedTuple, List, Sequence, Generator, Dict
+from bisect import bisect_right
+from itertools import islice
+from typing import (
+    NamedTuple,
+    List,
+    Sequence,
+    Generator,
+    Dict,
+    Tuple,
+    Iterable,
+    Optional,
+)
 from pprint import pprint
-from collections import defaultdict
+from collections import defaultdict, deque
+
+# Number of nearby tickets converted to an array at a time by iter_ticket_blocks
+BLOCK_ROWS = 65_536
 
 
 class TicketField(NamedTuple):
@@ -9,6 +23,14 @@ class TicketField(NamedTuple):
     ranges: Sequence[Sequence[int]]
 
 
+class FieldIndex(NamedTuple):
+    # Merged, sorted and non overlapping (lower, upper) ranges valid for any field
+    lowers: Tuple[int, ...]
+    uppers: Tuple[int, ...]
+    # field_masks[value] has bit i set when ticket field i accepts value
+    field_masks: Tuple[int, ...]
+
+
 def build_ticket_fields(fields: str) -> Sequence[TicketField]:
     """Build a TicketField object for every provided field."""
     ticket_fields = []
@@ -35,11 +57,104 @@ def parse_tickets(raw_tickets: str) -> Generator:
         yield tuple(int(num) for num in line.split(","))
 
 
+def iter_ticket_blocks(lines: Iterable[str], block_rows: int = BLOCK_ROWS) -> Generator:
+    """Yield 2D NumPy arrays (ticket, position) of at most block_rows tickets from the given ticket lines.
+
+    Blank lines and the section header are skipped so a file object positioned anywhere in the nearby tickets section can be streamed.
+    """
+    import numpy as np
+
+    lines = (line.strip() for line in lines)
+    tickets = (line for line in lines if line and line[0].isdigit())
+
+    while True:
+        block = list(islice(tickets, block_rows))
+        if not block:
+            return
+
+        yield np.loadtxt(block, delimiter=",", dtype=np.int64, ndmin=2)
+
+
+def scan_ticket_blocks(
+    ticket_fields: Sequence[TicketField], blocks: Iterable
+) -> Tuple[int, List[int]]:
+    """Return the scanning error rate and the per position field masks of the valid tickets, one block of tickets at a time."""
+    import numpy as np
+
+    if len(ticket_fields) > 64:
+        raise ValueError("Only 64 ticket fields fit in a uint64 field mask")
+
+    field_index = build_field_index(ticket_fields)
+    mask_lookup = np.array(field_index.field_masks, dtype=np.uint64)
+    all_fields = np.uint64((1 << len(ticket_fields)) - 1)
+
+    error_rate = 0
+    truth_table = None
+
+    for block in blocks:
+        # Values outside the indexed domain are not accepted by any field
+        in_domain = (block >= 0) & (block < len(mask_lookup))
+        masks = np.where(
+            in_domain,
+            mask_lookup[np.clip(block, 0, len(mask_lookup) - 1)],
+            np.uint64(0),
+        )
+
+        invalid = masks == 0
+        error_rate += int(block[invalid].sum())
+
+        valid_masks = masks[~invalid.any(axis=1)]
+        if truth_table is None:
+            truth_table = np.full(block.shape[1], all_fields, dtype=np.uint64)
+        truth_table &= np.bitwise_and.reduce(valid_masks, axis=0, initial=all_fields)
+
+    if truth_table is None:
+        return error_rate, []
+
+    return error_rate, [int(fields) for fields in truth_table]
+
+
 def field_in_range(ticket_field: TicketField, field_value: int) -> bool:
     """Test whether the given field_value is within limits for the given ticket_field"""
     return any(lower <= field_value <= upper for lower, upper in ticket_field.ranges)
 
 
+def build_field_index(ticket_fields: Sequence[TicketField]) -> FieldIndex:
+    """Compile the ranges of every ticket field into a FieldIndex, build it once and share it between lookups."""
+    merged: List[List[int]] = []
+    for lower, upper in sorted(
+        field_range
+        for ticket_field in ticket_fields
+        for field_range in ticket_field.ranges
+    ):
+        if merged and lower <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], upper)
+        else:
+            merged.append([lower, upper])
+
+    # Field values are bounded by the largest upper limit so a dense lookup table stays small
+    field_masks = [0] * (merged[-1][1] + 1 if merged else 0)
+    for field_idx, ticket_field in enumerate(ticket_fields):
+        bit = 1 << field_idx
+        for lower, upper in ticket_field.ranges:
+            for value in range(lower, upper + 1):
+                field_masks[value] |= bit
+
+    return FieldIndex(
+        lowers=tuple(lower for lower, _ in merged),
+        uppers=tuple(upper for _, upper in merged),
+        field_masks=tuple(field_masks),
+    )
+
+
+def field_mask(field_index: FieldIndex, field_value: int) -> int:
+    """Return a bitmask of every ticket field (by index) that accepts field_value."""
+    if 0 <= field_value < len(field_index.field_masks):
+        return field_index.field_masks[field_value]
+
+    return 0
+
+
 def valid_field(ticket_fields: Sequence[TicketField], field_value: int) -> bool:
     """Check the given field value against the rules for every ticket field"""
     return any(
@@ -47,9 +162,23 @@ def valid_field(ticket_fields: Sequence[TicketField], field_value: int) -> bool:
     )
 
 
-def valid_ticket(ticket_fields: Sequence[TicketField], ticket: Sequence[int]) -> bool:
-    """Test whether every field for the given ticket is valid."""
-    return all(valid_field(ticket_fields, field) for field in ticket)
+def indexed_valid_field(field_index: FieldIndex, field_value: int) -> bool:
+    """Check the given field value against the merged ranges of a FieldIndex."""
+    # Find the last merged range starting at or below field_value
+    idx = bisect_right(field_index.lowers, field_value) - 1
+    return idx >= 0 and field_value <= field_index.uppers[idx]
+
+
+def valid_ticket(
+    ticket_fields: Sequence[TicketField],
+    ticket: Sequence[int],
+    field_index: Optional[FieldIndex] = None,
+) -> bool:
+    """Test whether every field for the given ticket is valid, pass field_index when checking many tickets."""
+    if field_index is None:
+        field_index = build_field_index(ticket_fields)
+
+    return all(indexed_valid_field(field_index, field) for field in ticket)
 
 
 def collect_invalid_fields(
@@ -57,93 +186,197 @@ def collect_invalid_fields(
 ) -> Generator:
     """Scan every field for each ticket in nearby_tickets and yield each field value that is invalid for all fields in ticket_fields."""
 
+    field_index = build_field_index(ticket_fields)
+
     for ticket in nearby_tickets:
         for field in ticket:
-            if not valid_field(ticket_fields, field):
+            if not indexed_valid_field(field_index, field):
                 yield field
 
 
 def build_truth_table(
     ticket_fields: Sequence[TicketField], valid_tickets: Sequence[Sequence[int]]
-):
-    """Populate and return a 3D truth table (position, field_index, validity) for our given ticket_fields and valid_tickets"""
-
-    # 3D array, i=position j=field index in ticket_fields
+) -> List[int]:
+    """Return one bitmask per ticket position of the field indexes in ticket_fields that accept every value at that position."""
+    field_index = build_field_index(ticket_fields)
     num_positions = len(valid_tickets[0])
-    num_fields = len(ticket_fields)
 
-    truth_table = [[list() for j in range(num_fields)] for i in range(num_positions)]
+    # Start with every field possible for every position and narrow it down ticket by ticket
+    truth_table = [(1 << len(ticket_fields)) - 1] * num_positions
 
     for ticket in valid_tickets:
         for position, field_value in enumerate(ticket):
-            for field_idx, ticket_field in enumerate(ticket_fields):
-                validity = field_in_range(ticket_field, field_value)
-
-                truth_table[position][field_idx].append(validity)
+            truth_table[position] &= field_mask(field_index, field_value)
 
     return truth_table
 
 
-def find_possible_fields(truth_table):
-    """Iterate through the truth table and yield """
+def find_possible_fields(truth_table: Sequence[int]) -> Generator:
+    """Iterate through the truth table and yield (field_index, position) for every position with exactly one possible field"""
     for position, fields in enumerate(truth_table):
-        all_true = [all(values) for values in fields]
-        if all_true.count(True) == 1:
-            key_field = all_true.index(True)
-            yield key_field, position
+        # A power of two has exactly one possible field
+        if fields and fields & (fields - 1) == 0:
+            yield fields.bit_length() - 1, position
 
-    return None
 
-
-def deduce_truth_table(truth_table, ticket_fields):
-    deduced_fields = set()
+def match_fields(truth_table: Sequence[int]) -> Dict[int, int]:
+    """Return a maximum matching of {position: field_index} using Hopcroft-Karp."""
     num_positions = len(truth_table)
+    candidates = [
+        [
+            field_idx
+            for field_idx in range(fields.bit_length())
+            if fields >> field_idx & 1
+        ]
+        for fields in truth_table
+    ]
+
+    position_match: List[int] = [-1] * num_positions
+    field_match: Dict[int, int] = {}
+    unmatched_distance = num_positions + 1
+
+    def bfs() -> bool:
+        """Layer the free positions and report whether an augmenting path exists."""
+        nonlocal distance
+        distance = [unmatched_distance] * num_positions
+        queue = deque()
+        for position in range(num_positions):
+            if position_match[position] == -1:
+                distance[position] = 0
+                queue.append(position)
+
+        found = False
+        while queue:
+            position = queue.popleft()
+            for field_idx in candidates[position]:
+                matched = field_match.get(field_idx)
+                if matched is None:
+                    found = True
+                elif distance[matched] == unmatched_distance:
+                    distance[matched] = distance[position] + 1
+                    queue.append(matched)
+
+        return found
+
+    def dfs(position: int) -> bool:
+        """Follow the BFS layers from position to a free field and flip the path."""
+        for field_idx in candidates[position]:
+            matched = field_match.get(field_idx)
+            if matched is None or (
+                distance[matched] == distance[position] + 1 and dfs(matched)
+            ):
+                position_match[position] = field_idx
+                field_match[field_idx] = position
+                return True
+
+        distance[position] = unmatched_distance
+        return False
+
+    distance: List[int] = []
+    while bfs():
+        for position in range(num_positions):
+            if position_match[position] == -1:
+                dfs(position)
+
+    return {
+        position: field_idx
+        for position, field_idx in enumerate(position_match)
+        if field_idx != -1
+    }
+
+
+def deduce_truth_table(truth_table: Sequence[int], ticket_fields):
+    """Assign a field name to every position, eliminating forced fields first and matching whatever stays ambiguous."""
+    truth_table = list(truth_table)
     field_names = [ticket_field.name for ticket_field in ticket_fields]
-    ordered_field_names = [None] * len(field_names)
+    ordered_field_names = [None] * len(truth_table)
 
-    while len(deduced_fields) < num_positions:
+    deduced = True
+    while deduced:
+        deduced = False
         # key_field_idx is the index of the field_name i.e. 0 = class 1 = row 2 = seat
-        for key_field_idx, position in find_possible_fields(truth_table):
-            field_name = field_names[key_field_idx]
-            deduced_fields.add(field_name)
-            ordered_field_names[position] = field_name
-
-            # Having found what field this position is, set every other field for this position to not possible
-            for field_idx, fields in enumerate(truth_table[position]):
-                if field_idx != key_field_idx:
-                    truth_table[position][field_idx] = [False] * num_positions
+        for key_field_idx, position in list(find_possible_fields(truth_table)):
+            if ordered_field_names[position] is not None:
+                continue
+
+            # An earlier assignment in this pass may have taken the field already
+            key_field = 1 << key_field_idx
+            if truth_table[position] != key_field:
+                continue
+
+            deduced = True
+            ordered_field_names[position] = field_names[key_field_idx]
+
+            # Having found what field this position is, that field is no longer possible for any other position
+            for idx in range(len(truth_table)):
+                truth_table[idx] &= ~key_field
+            truth_table[position] = key_field
+
+            if not all(truth_table):
+                raise ValueError("No field assignment satisfies every position")
+
+    # Plain elimination can stall when several positions share the same candidates, match those instead
+    remaining = [
+        position
+        for position, field_name in enumerate(ordered_field_names)
+        if field_name is None
+    ]
+    if remaining:
+        matching = match_fields([truth_table[position] for position in remaining])
+        if len(matching) < len(remaining):
+            raise ValueError("No field assignment satisfies every position")
 
-            # Having found what field this position is, set that field for every other position to not possible
-            for idx, fields in enumerate(truth_table):
-                if idx != position:
-                    truth_table[idx][key_field_idx] = [False] * num_positions
+        for idx, field_idx in matching.items():
+            ordered_field_names[remaining[idx]] = field_names[field_idx]
 
     return ordered_field_names
 
 
 if __name__ == "__main__":
     filename = sys.argv[1]
-
-    contents = open(filename).read()
-
-    parts = contents.split("\n\n")
-    _fields, _my_ticket, _nearby_tickets = parts
+    # Stream the nearby tickets through NumPy in blocks instead of holding them all as tuples
+    use_blocks = "--blocks" in sys.argv[2:]
+
+    if use_blocks:
+        f = open(filename)
+        # Read up to the nearby tickets header, leaving f at the first nearby ticket
+        header = []
+        for line in f:
+            if line.strip() == "nearby tickets:":
+                break
+            header.append(line)
+        else:
+            raise ValueError(f"{filename} has no nearby tickets section")
+        _fields, _my_ticket = "".join(header).strip().split("\n\n")
+    else:
+        contents = open(filename).read()
+
+        parts = contents.split("\n\n")
+        _fields, _my_ticket, _nearby_tickets = parts
 
     ticket_fields = build_ticket_fields(_fields)
     my_ticket = next(parse_tickets(_my_ticket))
-    nearby_tickets = tuple(ticket for ticket in parse_tickets(_nearby_tickets))
 
-    total = sum(
-        field for field in collect_invalid_fields(ticket_fields, nearby_tickets)
-    )
+    if use_blocks:
+        total, truth_table = scan_ticket_blocks(ticket_fields, iter_ticket_blocks(f))
+    else:
+        nearby_tickets = tuple(ticket for ticket in parse_tickets(_nearby_tickets))
 
-    print(f"Part 1 ticket scanning error rate is: {total}")
+        total = sum(
+            field for field in collect_invalid_fields(ticket_fields, nearby_tickets)
+        )
 
-    valid_nearby_tickets = [
-        ticket for ticket in nearby_tickets if valid_ticket(ticket_fields, ticket)
-    ]
+        field_index = build_field_index(ticket_fields)
+        valid_nearby_tickets = [
+            ticket
+            for ticket in nearby_tickets
+            if valid_ticket(ticket_fields, ticket, field_index)
+        ]
+
+        truth_table = build_truth_table(ticket_fields, valid_nearby_tickets)
+
+    print(f"Part 1 ticket scanning error rate is: {total}")
 
-    truth_table = build_truth_table(ticket_fields, valid_nearby_tickets)
     ordered_field_names = deduce_truth_table(truth_table, ticket_fields)
 
     total = 1
@@ -154,4 +387,4 @@ if __name__ == "__main__":
     # total=360952328957119 too high
     # total=2016493457861 too low
 
-    print(f"Part 2 total: {total}")
\ No newline at end of file
+    print(f"Part 2 total: {total}")
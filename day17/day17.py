@@ -1,24 +1,43 @@
 import sys
-from typing import Sequence, Dict, Tuple, Union, List
+from collections import Counter
+from functools import lru_cache
+from itertools import product
+from typing import Sequence, Dict, Tuple, Union, List, Set
 
 ACTIVE = "#"
 INACTIVE = "."
 CYCLE_LIMIT = 6
 
+# iterate_folded packs each point into an int of FOLD_BITS per coordinate so neighbors are a single addition away
+FOLD_BITS = 16
+FOLD_OFFSET = 1 << (FOLD_BITS - 1)
+
+
+@lru_cache(maxsize=None)
+def neighbor_offsets(dimensions: int = 3) -> Tuple[Tuple[int, ...], ...]:
+    """Return the offsets from a point to each of its neighbors in the given number of dimensions."""
+    origin = (0,) * dimensions
+    return tuple(
+        offset for offset in product((-1, 0, 1), repeat=dimensions) if offset != origin
+    )
+
 
 def initialize_grid(lines: Sequence[str], dimensions: int = 3, z: int = 0, w: int = 0):
-    """Generate the point and the initial state of that point from the given input lines."""
-    assert dimensions in (3, 4)
+    """Generate the point and the initial state of that point from the given input lines.
+
+    The input is a 2D slice at z, w and 0 for every dimension past the fourth.
+    """
+    assert dimensions >= 3
 
     grid: Dict[Tuple[int, ...], str] = {}
 
+    # Slice coordinates shared by every point, (z,) for 3 dimensions, (z, w, 0, ...) past that
+    extra: Tuple[int, ...] = ((z, w) + (0,) * dimensions)[: dimensions - 2]
+
     point: Tuple[int, ...]
     for i, line in enumerate(lines):
         for j, char in enumerate(line):
-            if dimensions == 3:
-                point = (i, j, z)
-            else:
-                point = (i, j, z, w)
+            point = (i, j) + extra
 
             grid[point] = char
 
@@ -26,32 +45,15 @@ def initialize_grid(lines: Sequence[str], dimensions: int = 3, z: int = 0, w: in
 
 
 def generate_neighbors(point: Tuple[int, ...], dimensions: int = 3):
-    """Generate all the neighbors of the given 3 or 4 dimensional point."""
-    assert dimensions in (3, 4)
-
-    if dimensions == 3:
-        x, y, z = point
-    else:
-        x, y, z, w = point
-
-    for X in (x - 1, x, x + 1):
-        for Y in (y - 1, y, y + 1):
-            for Z in (z - 1, z, z + 1):
-                if dimensions == 3:
-                    if (X, Y, Z) != point:
-                        yield (X, Y, Z)
-                else:
-                    for W in (w - 1, w, w + 1):
-                        if (X, Y, Z, W) != point:
-                            yield (X, Y, Z, W)
+    """Generate all the neighbors of the given point in any number of dimensions."""
+    for offset in neighbor_offsets(dimensions):
+        yield tuple(p + o for p, o in zip(point, offset))
 
 
 def count_active_neighbors(
     grid: Dict[Tuple[int, ...], str], point: Tuple[int, ...], dimensions: int = 3
 ):
-    """Count the active neighbors of the given 3 or 4 dimensional point"""
-    assert dimensions in (3, 4)
-
+    """Count the active neighbors of the given point"""
     return sum(
         1
         for neighbor_point in generate_neighbors(point, dimensions=dimensions)
@@ -61,8 +63,6 @@ def count_active_neighbors(
 
 def iterate_simulation(grid: Dict[Tuple[int, ...], str], dimensions: int = 3):
     """Make one pass at the simulation from the starting grid state and return a new grid."""
-    assert dimensions in (3, 4)
-
     new_grid: Dict[Tuple[int, ...], str] = {}
 
     point: Tuple[int, ...]
@@ -84,25 +84,221 @@ def iterate_simulation(grid: Dict[Tuple[int, ...], str], dimensions: int = 3):
     return new_grid
 
 
-if __name__ == "__main__":
-    filename: str = sys.argv[1]
+def collect_active_points(grid: Dict[Tuple[int, ...], str]) -> Set[Tuple[int, ...]]:
+    """Return the set of active points in the given grid."""
+    return {point for point, state in grid.items() if state == ACTIVE}
 
-    contents: List[str] = [line.strip() for line in open(filename).readlines()]
 
-    grid: Dict[Tuple[int, ...], str] = initialize_grid(contents)
+def iterate_active(
+    active: Set[Tuple[int, ...]], dimensions: int = 3
+) -> Set[Tuple[int, ...]]:
+    """Make one pass at the simulation tracking only the active points and return the new set of active points."""
+    offsets = neighbor_offsets(dimensions)
+
+    # Every active point adds one to the count of each of its neighbors, points with no active neighbors never appear
+    counts: Counter = Counter(
+        tuple(p + o for p, o in zip(point, offset))
+        for point in active
+        for offset in offsets
+    )
+
+    return {
+        point
+        for point, count in counts.items()
+        if count == 3 or (count == 2 and point in active)
+    }
+
+
+def fold_point(point: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Mirror point into the canonical orthant where every coordinate past x, y is non negative."""
+    return point[:2] + tuple(abs(coord) for coord in point[2:])
+
+
+def mirror_multiplicity(point: Tuple[int, ...]) -> int:
+    """Return how many points in the full pocket dimension the canonical point stands for."""
+    return 1 << sum(1 for coord in point[2:] if coord)
+
+
+def pack_point(point: Tuple[int, ...]) -> int:
+    """Pack the coordinates of point into a single int, FOLD_BITS per coordinate."""
+    key = 0
+    for coord in reversed(point):
+        key = key << FOLD_BITS | (coord + FOLD_OFFSET)
+    return key
+
+
+def unpack_point(key: int, dimensions: int) -> Tuple[int, ...]:
+    """Return the coordinates packed into key by pack_point."""
+    mask = (1 << FOLD_BITS) - 1
+    return tuple(
+        (key >> (FOLD_BITS * axis) & mask) - FOLD_OFFSET for axis in range(dimensions)
+    )
+
+
+@lru_cache(maxsize=None)
+def folded_offsets(
+    boundaries: Tuple[int, ...],
+) -> Tuple[Tuple[int, Tuple[int, ...]], ...]:
+    """Return the packed neighbor offsets of a canonical point grouped by weight, for the given boundary class of each coordinate past x, y.
+
+    A coordinate's class is 0, 1 or 2 for anything further out. The weight of an offset is how many mirror images
+    of the point neighbor the canonical point it reaches: a coordinate at 0 can't step to -1, and one at 1 reaches 0
+    from both 1 and -1.
+    """
+    axis_weights = {0: {0: 1, 1: 1}, 1: {-1: 2, 0: 1, 1: 1}, 2: {-1: 1, 0: 1, 1: 1}}
+
+    grouped: Dict[int, List[int]] = {}
+    for steps in product(*(axis_weights[boundary].items() for boundary in boundaries)):
+        extra = tuple(step for step, _ in steps)
+        weight = 1
+        for _, step_weight in steps:
+            weight *= step_weight
+
+        for dx, dy in product((-1, 0, 1), repeat=2):
+            offset = (dx, dy) + extra
+            if any(offset):
+                # Offsets pack like points, adding one moves every coordinate at once
+                delta = sum(o << (FOLD_BITS * axis) for axis, o in enumerate(offset))
+                grouped.setdefault(weight, []).append(delta)
+
+    return tuple((weight, tuple(offsets)) for weight, offsets in grouped.items())
+
+
+def iterate_folded(
+    active: Set[Tuple[int, ...]], dimensions: int = 3
+) -> Set[Tuple[int, ...]]:
+    """Make one pass at the simulation over the canonical orthant of a slice that is symmetric in every dimension past x, y.
+
+    active and the returned set only hold canonical points, see fold_point.
+    """
+    counts: Counter = Counter()
+    active_keys = set()
+
+    for point in active:
+        key = pack_point(point)
+        active_keys.add(key)
 
-    for cycle in range(CYCLE_LIMIT):
-        print(f"3 Dimensions cycle: {cycle}")
-        grid = iterate_simulation(grid)
+        boundaries = tuple(min(coord, 2) for coord in point[2:])
+        for weight, deltas in folded_offsets(boundaries):
+            for _ in range(weight):
+                counts.update(map(key.__add__, deltas))
 
-    count = sum(1 for cell in grid.values() if cell == ACTIVE)
-    print(f"Part 1 count: {count}")
+    return {
+        unpack_point(key, dimensions)
+        for key, count in counts.items()
+        if count == 3 or (count == 2 and key in active_keys)
+    }
 
-    grid = initialize_grid(contents, dimensions=4)
 
-    for cycle in range(CYCLE_LIMIT):
-        print(f"4 Dimensions cycle: {cycle}")
-        grid = iterate_simulation(grid, dimensions=4)
+def count_folded(active: Set[Tuple[int, ...]]) -> int:
+    """Count the active points in the full pocket dimension from the canonical active points."""
+    return sum(mirror_multiplicity(point) for point in active)
+
+
+def initialize_array(lines: Sequence[str], dimensions: int = 3):
+    """Return the starting slice as a dense uint8 NumPy array with one cell along every dimension past x, y."""
+    import numpy as np
+
+    cells = np.array(
+        [[char == ACTIVE for char in line] for line in lines], dtype=np.uint8
+    )
+    return cells.reshape(cells.shape + (1,) * (dimensions - 2))
+
+
+def grow_array(cells):
+    """Pad cells by one inactive cell on every side where an active cell touches the boundary."""
+    import numpy as np
+
+    padding = []
+    for axis in range(cells.ndim):
+        first = np.take(cells, 0, axis=axis).any()
+        last = np.take(cells, -1, axis=axis).any()
+        padding.append((int(first), int(last)))
+
+    return np.pad(cells, padding)
+
+
+def box_sum(cells):
+    """Return the sum of the 3x3x... box around every cell as a separable sum along each axis."""
+    import numpy as np
+
+    # 3 ** dimensions can overflow uint8 past 5 dimensions
+    sums = cells.astype(np.uint16)
+    for axis in range(cells.ndim):
+        padded = np.pad(
+            sums, [(1, 1) if a == axis else (0, 0) for a in range(sums.ndim)]
+        )
+        length = sums.shape[axis]
+
+        def shifted(start: int):
+            index = [slice(None)] * sums.ndim
+            index[axis] = slice(start, start + length)
+            return padded[tuple(index)]
+
+        sums = shifted(0) + shifted(1) + shifted(2)
+
+    return sums
+
+
+def iterate_dense(cells):
+    """Make one pass at the simulation on a dense array of cells and return the new array, grown if needed."""
+    import numpy as np
+
+    cells = grow_array(cells)
+    counts = box_sum(cells) - cells
+
+    alive = (counts == 3) | ((cells == 1) & (counts == 2))
+    return alive.astype(np.uint8)
+
+
+def run_simulation(
+    lines: Sequence[str],
+    dimensions: int = 3,
+    cycles: int = CYCLE_LIMIT,
+    backend: str = "folded",
+) -> int:
+    """Run the simulation for the given number of cycles with the chosen backend and return the active count.
+
+    backend: "grid" (iterate_simulation), "sparse" (iterate_active), "folded" (iterate_folded) or "dense" (iterate_dense)
+    """
+    if backend == "dense":
+        cells = initialize_array(lines, dimensions=dimensions)
+        for _ in range(cycles):
+            cells = iterate_dense(cells)
+        return int(cells.sum())
+
+    grid = initialize_grid(lines, dimensions=dimensions)
+
+    if backend == "grid":
+        for _ in range(cycles):
+            grid = iterate_simulation(grid, dimensions=dimensions)
+        return sum(1 for cell in grid.values() if cell == ACTIVE)
+
+    active = collect_active_points(grid)
+
+    if backend == "sparse":
+        for _ in range(cycles):
+            active = iterate_active(active, dimensions=dimensions)
+        return len(active)
+
+    if backend == "folded":
+        for _ in range(cycles):
+            active = iterate_folded(active, dimensions=dimensions)
+        return count_folded(active)
+
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+if __name__ == "__main__":
+    filename: str = sys.argv[1]
+    # Optionally keep simulating in every dimension up to the given count
+    max_dimensions: int = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    # One of the run_simulation backends
+    backend: str = sys.argv[3] if len(sys.argv) > 3 else "folded"
+
+    contents: List[str] = [line.strip() for line in open(filename).readlines()]
 
-    count = sum(1 for cell in grid.values() if cell == ACTIVE)
-    print(f"Part 2 count: {count}")
+    for dimensions in range(3, max_dimensions + 1):
+        print(f"{dimensions} Dimensions with the {backend} backend")
+        count = run_simulation(contents, dimensions=dimensions, backend=backend)
+        print(f"Part {dimensions - 2} count: {count}")
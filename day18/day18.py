@@ -1,8 +1,41 @@
+import os
+import re
 import sys
+import mmap
 import string
-from collections import defaultdict, deque
+from functools import lru_cache
+from multiprocessing import Pool, cpu_count
+from operator import add, sub, mul
+from typing import NamedTuple, List, Tuple, Optional, Generator
 
 OPERATORS = ("+", "-", "*")
+OPERATIONS = {"+": add, "-": sub, "*": mul}
+
+# Part 1 evaluates left to right, part 2 evaluates addition before multiplication
+PART1_PRECEDENCE = {"+": 1, "-": 1, "*": 1}
+PART2_PRECEDENCE = {"+": 2, "-": 2, "*": 1}
+PRECEDENCES = {1: PART1_PRECEDENCE, 2: PART2_PRECEDENCE}
+
+# Integer token codes emitted by tokenize_bytes, int literals are always non negative
+LPAREN, RPAREN, ADD, SUB, MUL = -1, -2, -3, -4, -5
+TOKEN_CODES = {"(": LPAREN, ")": RPAREN, "+": ADD, "-": SUB, "*": MUL}
+BYTE_CODES = {token.encode(): code for token, code in TOKEN_CODES.items()}
+CODE_OPERATIONS = {TOKEN_CODES[token]: func for token, func in OPERATIONS.items()}
+CODE_PRECEDENCES = {
+    part: {TOKEN_CODES[token]: level for token, level in precedence.items()}
+    for part, precedence in PRECEDENCES.items()
+}
+TOKEN_PATTERN = re.compile(rb"\d+|[-+*()\n]")
+
+# Bound the memoized expressions so huge homework files can't grow the cache without limit
+CACHE_SIZE = 1 << 20
+
+
+class HomeworkResults(NamedTuple):
+    part1_values: List[int]
+    part2_values: List[int]
+    part1_total: int
+    part2_total: int
 
 
 def tokenize(raw_expression):
@@ -24,59 +57,152 @@ def tokenize(raw_expression):
         yield "".join(token)
 
 
-def build_expression_tree(tokens):
-    expressions = defaultdict(list)
-    # expressions = []
-    sub_expr = []
-    depth = 0
-    for idx, token in enumerate(tokens):
-        if token == "(":
-            if sub_expr:
-                expressions[depth].append(sub_expr)
-                # expressions.append(sub_expr)
-            sub_expr = []
-            depth += 1
-        elif token == ")":
-            if sub_expr:
-                expressions[depth].append(sub_expr)
-                # expressions.append(sub_expr)
-            sub_expr = []
-            depth -= 1
+def compile_expression(tokens, precedence=PART1_PRECEDENCE, parens=("(", ")")):
+    """Compile the given infix tokens into a postfix program using the shunting-yard algorithm.
+
+    precedence: operator -> binding strength, operators of equal strength are applied left to right
+    parens: the opening and closing parenthesis tokens, (LPAREN, RPAREN) for token codes
+    """
+    lparen, rparen = parens
+    program = []
+    pending = []
+
+    for token in tokens:
+        if token in precedence:
+            # Apply every pending operator that binds at least as tightly before this one
+            while (
+                pending
+                and pending[-1] != lparen
+                and precedence[pending[-1]] >= precedence[token]
+            ):
+                program.append(pending.pop())
+            pending.append(token)
+        elif token == lparen:
+            pending.append(token)
+        elif token == rparen:
+            while pending[-1] != lparen:
+                program.append(pending.pop())
+            pending.pop()
+        else:
+            program.append(int(token))
+
+    while pending:
+        program.append(pending.pop())
+
+    return tuple(program)
+
+
+def evaluate_program(program, operations=OPERATIONS):
+    """Evaluate a postfix program produced by compile_expression, operations maps each operator to its function."""
+    stack = []
+
+    for token in program:
+        if token in operations:
+            right = stack.pop()
+            stack[-1] = operations[token](stack[-1], right)
+        else:
+            stack.append(token)
+
+    return stack[0]
+
+
+def solve(raw_expression, precedence=PART1_PRECEDENCE):
+    """Return the value of the given string expression under the given operator precedence."""
+    return evaluate_program(compile_expression(tokenize(raw_expression), precedence))
+
+
+def tokenize_bytes(buffer, start: int = 0, stop: Optional[int] = None) -> Generator:
+    """Yield a tuple of integer token codes for every non blank line in the given byte range of buffer (bytes or mmap)."""
+    stop = len(buffer) if stop is None else stop
+    codes: List[int] = []
+
+    for match in TOKEN_PATTERN.finditer(buffer, start, stop):
+        token = match.group()
+        if token == b"\n":
+            if codes:
+                yield tuple(codes)
+                codes = []
         else:
-            sub_expr.append(token)
+            # Every operator code is negative, so a literal is the only token missing from BYTE_CODES
+            codes.append(BYTE_CODES.get(token) or int(token))
+
+    if codes:
+        yield tuple(codes)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def evaluate_tokens(tokens: Tuple[int, ...], part: int = 1) -> int:
+    """Evaluate the given token code tuple under the precedence rules for part, memoizing whole expressions."""
+    program = compile_expression(tokens, CODE_PRECEDENCES[part], (LPAREN, RPAREN))
+    return evaluate_program(program, CODE_OPERATIONS)
 
-    return expressions
 
+def shard_ranges(filename: str, shards: int) -> List[Tuple[int, int]]:
+    """Split the file into at most shards (start, stop) byte ranges that each begin and end on a line boundary."""
+    size = os.path.getsize(filename)
+    boundaries = [0]
 
-def build_expression_tree(tokens):
+    with open(filename, "rb") as f:
+        for shard in range(1, shards):
+            f.seek(max(size * shard // shards, boundaries[-1]))
+            # Finish the current line so the next shard starts on a fresh one
+            f.readline()
+            boundaries.append(min(f.tell(), size))
 
-    evaluatable = ""
-    open_indexes = []
+    boundaries.append(size)
 
-    valid = False
-    while not valid:
+    return [
+        (start, stop) for start, stop in zip(boundaries, boundaries[1:]) if start < stop
+    ]
 
-        total = eval(evaluatable)
 
-        if total:
-            valid = True
+def evaluate_shard(filename: str, start: int, stop: int) -> Tuple[List[int], List[int]]:
+    """Evaluate every line in the given byte range of filename under both precedence rules."""
+    part1_values: List[int] = []
+    part2_values: List[int] = []
 
-        for idx, token in enumerate(tokens):
-            if token == "(":
-                open_indexes.append(idx)
-            elif token == ")":
-                pass
-            else:
-                pass
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for tokens in tokenize_bytes(mm, start, stop):
+                part1_values.append(evaluate_tokens(tokens, 1))
+                part2_values.append(evaluate_tokens(tokens, 2))
+
+    return part1_values, part2_values
+
+
+def evaluate_homework(
+    filename: str, processes: Optional[int] = None
+) -> HomeworkResults:
+    """Evaluate every line of the homework file under both precedence rules, sharding the file across a process pool."""
+    processes = processes or cpu_count()
+    ranges = shard_ranges(filename, processes)
+
+    if processes == 1 or len(ranges) == 1:
+        results = [evaluate_shard(filename, start, stop) for start, stop in ranges]
+    else:
+        with Pool(processes) as pool:
+            results = pool.starmap(
+                evaluate_shard, ((filename, start, stop) for start, stop in ranges)
+            )
+
+    part1_values = [value for values, _ in results for value in values]
+    part2_values = [value for _, values in results for value in values]
+
+    return HomeworkResults(
+        part1_values=part1_values,
+        part2_values=part2_values,
+        part1_total=sum(part1_values),
+        part2_total=sum(part2_values),
+    )
 
 
 if __name__ == "__main__":
     filename = sys.argv[1]
 
-    raw_expressions = [line.strip() for line in open(filename).readlines()]
-
-    tokens = list(tokenize(raw_expressions[0]))
+    results = evaluate_homework(filename)
 
-    tree = build_expression_tree(tokens)
+    total = results.part1_total
+    print(f"Part 1: {total=}")
 
-    pass
\ No newline at end of file
+    total = results.part2_total
+    print(f"Part 2: {total=}")
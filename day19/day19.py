@@ -1,6 +1,31 @@
+import re
 import sys
+import time
+from functools import lru_cache
+from itertools import islice
+from multiprocessing import Pool, cpu_count
 from pprint import pprint
-from typing import NamedTuple, Tuple
+from typing import (
+    NamedTuple,
+    Tuple,
+    Dict,
+    Callable,
+    FrozenSet,
+    List,
+    Optional,
+    Generator,
+    TextIO,
+)
+
+# Part 2 replaces these rules with looping versions
+PART2_RULES = """8: 42 | 42 8
+11: 42 31 | 42 11 31"""
+
+# Number of messages handed to a worker at a time by validate_messages
+CHUNK_SIZE = 10_000
+
+# Matcher built once per worker process by init_validation_worker from the parent's Grammar
+_worker_matches: Optional[Callable[[str], bool]] = None
 
 
 class Rule(NamedTuple):
@@ -10,6 +35,23 @@ class Rule(NamedTuple):
     char: str
 
 
+class Grammar(NamedTuple):
+    rule_id: str
+    # Regular expression source for rule_id, None when the rules loop
+    pattern: Optional[str]
+    # Rule id -> alternatives (sequences of sub rule ids) and base rule id -> char, only set when the rules loop
+    alternatives: Dict[str, Tuple[Tuple[str, ...], ...]]
+    chars: Dict[str, str]
+
+
+class ValidationResults(NamedTuple):
+    count: int
+    total: int
+    matching_indexes: Optional[List[int]]
+    elapsed: float
+    messages_per_second: float
+
+
 def parse_rules(raw_rules):
     # Every rule is either a combination of other rules, or a character to match against
 
@@ -53,32 +95,230 @@ def split_sub_rules(sub_rules):
     return left, right
 
 
-if __name__ == "__main__":
-    filename = sys.argv[1]
+def rule_alternatives(rule: Rule) -> Tuple[Tuple[str, ...], ...]:
+    """Return every sequence of sub rules that can satisfy the given rule."""
+    return tuple(
+        alternative for alternative in split_sub_rules(rule.sub_rules) if alternative
+    )
 
-    contents = open(filename).read()
-    rules, text = contents.split("\n\n")
-    rules_tree = parse_rules(rules)
 
-    top_rule = rules_tree["0"]
+def is_recursive(rules_tree: Dict[str, Rule], rule_id: str = "0") -> bool:
+    """Test whether any rule reachable from rule_id refers back to itself."""
+    visiting = set()
+    done = set()
 
-    combinations = []
-    combo = []
+    def visit(current: str) -> bool:
+        if current in visiting:
+            return True
+        if current in done:
+            return False
 
-    for rule in top_rule.sub_rules:
-        sub_rule = rules_tree[rule]
+        visiting.add(current)
+        found = any(
+            visit(sub_rule)
+            for sub_rule in rules_tree[current].sub_rules
+            if sub_rule != "|"
+        )
+        visiting.remove(current)
+        done.add(current)
 
-        if sub_rule.base_rule:
-            combo.append(rule)
-        else:
-            left, right = split_sub_rules(sub_rule.sub_rules)
+        return found
+
+    return visit(rule_id)
+
+
+def compile_pattern(rules_tree: Dict[str, Rule], rule_id: str = "0") -> str:
+    """Return a regular expression equivalent to the given non recursive rule."""
+
+    @lru_cache(maxsize=None)
+    def pattern(current: str) -> str:
+        rule = rules_tree[current]
+        if rule.base_rule:
+            return re.escape(rule.char)
+
+        alternatives = [
+            "".join(pattern(sub_rule) for sub_rule in alternative)
+            for alternative in rule_alternatives(rule)
+        ]
+        if len(alternatives) == 1:
+            return alternatives[0]
+
+        return f"(?:{'|'.join(alternatives)})"
+
+    return pattern(rule_id)
+
+
+def compile_grammar(rules_tree: Dict[str, Rule], rule_id: str = "0") -> Grammar:
+    """Compile the rules once into a picklable Grammar, a regex source unless the rules loop."""
+    if not is_recursive(rules_tree, rule_id):
+        return Grammar(rule_id, compile_pattern(rules_tree, rule_id), {}, {})
+
+    alternatives = {
+        current: tuple(tuple(alternative) for alternative in rule_alternatives(rule))
+        for current, rule in rules_tree.items()
+    }
+    chars = {
+        current: rule.char for current, rule in rules_tree.items() if rule.base_rule
+    }
+
+    return Grammar(rule_id, None, alternatives, chars)
+
+
+def end_matcher(
+    alternatives: Dict[str, Tuple[Tuple[str, ...], ...]],
+    chars: Dict[str, str],
+    rule_id: str = "0",
+) -> Callable[[str], bool]:
+    """Return a function testing whether a whole message matches rule_id.
+
+    Every rule maps a start index to the set of indexes it can end at, memoized per message, which also handles looping rules.
+    """
+
+    def matches(message: str) -> bool:
+        @lru_cache(maxsize=None)
+        def ends(current: str, start: int) -> FrozenSet[int]:
+            if current in chars:
+                if message.startswith(chars[current], start):
+                    return frozenset((start + len(chars[current]),))
+                return frozenset()
+
+            found = set()
+            for alternative in alternatives[current]:
+                positions = {start}
+                for sub_rule in alternative:
+                    positions = {
+                        end
+                        for position in positions
+                        for end in ends(sub_rule, position)
+                    }
+                    if not positions:
+                        break
+                found |= positions
+
+            return frozenset(found)
 
-            if left:
-                combinations.append(combo + list(left))
+        return len(message) in ends(rule_id, 0)
+
+    return matches
+
+
+def grammar_matcher(grammar: Grammar) -> Callable[[str], bool]:
+    """Return a function testing whether a whole message matches a compiled Grammar."""
+    if grammar.pattern is None:
+        return end_matcher(grammar.alternatives, grammar.chars, grammar.rule_id)
+
+    pattern = re.compile(grammar.pattern)
+    return lambda message: pattern.fullmatch(message) is not None
+
+
+def compile_matcher(
+    rules_tree: Dict[str, Rule], rule_id: str = "0"
+) -> Callable[[str], bool]:
+    """Return the fastest function testing whether a whole message matches rule_id, a single regex unless the rules loop."""
+    return grammar_matcher(compile_grammar(rules_tree, rule_id))
+
+
+def iter_message_chunks(f: TextIO, chunk_size: int = CHUNK_SIZE) -> Generator:
+    """Skip the rules section of the open file and yield (first message index, messages) chunks of the messages that follow."""
+    for line in f:
+        if not line.strip():
+            break
+
+    messages = (line.strip() for line in f if line.strip())
+    first_index = 0
+    while True:
+        chunk = list(islice(messages, chunk_size))
+        if not chunk:
+            return
+
+        yield first_index, chunk
+        first_index += len(chunk)
+
+
+def init_validation_worker(grammar: Grammar):
+    """Build this worker's matcher from the grammar compiled by the parent."""
+    global _worker_matches
+    _worker_matches = grammar_matcher(grammar)
+
+
+def validate_chunk(
+    args: Tuple[int, List[str], bool],
+) -> Tuple[int, int, Optional[List[int]]]:
+    """Return (matches, messages, matching indexes or None) for one chunk using the worker's compiled grammar."""
+    first_index, messages, collect_indexes = args
+
+    indexes = [
+        first_index + idx
+        for idx, message in enumerate(messages)
+        if _worker_matches(message)
+    ]
+
+    return len(indexes), len(messages), indexes if collect_indexes else None
+
+
+def validate_messages(
+    filename: str,
+    rules_tree: Dict[str, Rule],
+    rule_id: str = "0",
+    processes: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    collect_indexes: bool = False,
+) -> ValidationResults:
+    """Stream the messages in filename through a process pool sharing one compiled grammar and count those matching rule_id.
+
+    collect_indexes: also return the (0 based) index of every matching message
+    """
+    start_time = time.time()
+    count = total = 0
+    matching_indexes: Optional[List[int]] = [] if collect_indexes else None
+
+    # Compile once here, workers only receive the regex source or the rule tables
+    grammar = compile_grammar(rules_tree, rule_id)
+
+    with open(filename) as f, Pool(
+        processes or cpu_count(),
+        initializer=init_validation_worker,
+        initargs=(grammar,),
+    ) as pool:
+        chunks = (
+            (first_index, messages, collect_indexes)
+            for first_index, messages in iter_message_chunks(f, chunk_size)
+        )
+        # imap keeps the chunks in file order so the indexes come back sorted
+        for matches, messages, indexes in pool.imap(validate_chunk, chunks):
+            count += matches
+            total += messages
+            if collect_indexes:
+                matching_indexes.extend(indexes)
+
+    elapsed = time.time() - start_time
+
+    return ValidationResults(
+        count=count,
+        total=total,
+        matching_indexes=matching_indexes,
+        elapsed=elapsed,
+        messages_per_second=total / elapsed if elapsed else 0.0,
+    )
+
+
+if __name__ == "__main__":
+    filename = sys.argv[1]
+
+    contents = open(filename).read()
+    rules, text = contents.split("\n\n")
+    rules_tree = parse_rules(rules)
 
-            if right:
-                combinations.append(combo + list(right))
+    results = validate_messages(filename, rules_tree)
+    count = results.count
+    print(f"Part 1: {count=} ({results.messages_per_second:.0f} messages/s)")
 
+    # Looping rules only make sense if the rules they refer to exist
+    if all(rule_id in rules_tree for rule_id in ("8", "11", "31", "42")):
+        rules_tree.update(parse_rules(PART2_RULES))
+        results = validate_messages(filename, rules_tree)
+        count = results.count
+        print(f"Part 2: {count=} ({results.messages_per_second:.0f} messages/s)")
 
 # 0: 1 2
 # 1: "a"
@@ -86,4 +326,4 @@ if __name__ == "__main__":
 # 3: "b"
 
 # a a b
-# a b a
\ No newline at end of file
+# a b a
@@ -1,8 +1,28 @@
 import sys
-from typing import NamedTuple, Tuple, Dict, List, Generator, Deque, Union
-from collections import deque
+import math
+from typing import (
+    NamedTuple,
+    Tuple,
+    Dict,
+    List,
+    Generator,
+    Deque,
+    Union,
+    Set,
+    Optional,
+    Iterable,
+)
+from collections import deque, defaultdict, Counter
 from functools import reduce
-from copy import deepcopy
+
+SEA_MONSTER = """\
+                  # 
+#    ##    ##    ###
+ #  #  #  #  #  #   """
+
+
+# Every byte with its bits reversed
+REVERSED_BYTES = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
 
 
 class Tile(NamedTuple):
@@ -16,6 +36,33 @@ class Image(NamedTuple):
     pixels: Tuple[Tuple[str, ...], ...]
 
 
+class PackedTile(NamedTuple):
+    tile_id: int
+    size: int
+    # One int per row, the leftmost pixel is the most significant bit
+    rows: Tuple[int, ...]
+
+
+class PackedImage(NamedTuple):
+    size: int
+    rows: Tuple[int, ...]
+
+
+class Pattern(NamedTuple):
+    width: int
+    # One int per pattern row, width bits wide, leftmost pixel most significant
+    rows: Tuple[int, ...]
+
+
+class EdgeIndex(NamedTuple):
+    tiles: Dict[int, PackedTile]
+    # (top, right, bottom, left) edge codes of every orientation of every tile, in all_tile_orientations order
+    edges: Dict[int, Tuple[Tuple[int, int, int, int], ...]]
+    # Edge code -> (tile_id, orientation) of every oriented tile with that top or left edge
+    top: Dict[int, List[Tuple[int, int]]]
+    left: Dict[int, List[Tuple[int, int]]]
+
+
 def build_tile(raw_tile: str) -> Tile:
     """Build a new tile from the given string."""
     tile_lines: List[str] = raw_tile.split("\n")
@@ -40,7 +87,7 @@ def build_tiles(filename: str) -> Dict[int, Tile]:
 
 
 def vertical_flip_pixels(
-    pixels: Tuple[Tuple[str, ...], ...]
+    pixels: Tuple[Tuple[str, ...], ...],
 ) -> Tuple[Tuple[str, ...], ...]:
     "Vertically flip the given pixel grid."
     return tuple(row for row in reversed(pixels))
@@ -57,7 +104,7 @@ def vertical_flip_image(image: Image) -> Image:
 
 
 def rotate_pixels_90(
-    pixels: Tuple[Tuple[str, ...], ...]
+    pixels: Tuple[Tuple[str, ...], ...],
 ) -> Tuple[Tuple[str, ...], ...]:
     """Rotate the given pixel grid 90 degrees."""
     size: int = len(pixels)
@@ -126,6 +173,159 @@ def right_edge(tile: Tile) -> Tuple[str, ...]:
     return tuple(row[-1] for row in tile.pixels)
 
 
+def edge_code(edge: Iterable[str], pixel: str = "#", blank: str = ".") -> int:
+    """Encode the given edge as an integer with one bit per pixel, first pixel most significant."""
+    return int("".join(edge).translate(str.maketrans(pixel + blank, "10")), 2)
+
+
+def reverse_bits(code: int, size: int) -> int:
+    """Reverse the order of the size lowest bits of code, i.e. read an edge from the other end."""
+    # Reverse the byte order and the bits of every byte, then drop the padding bits
+    num_bytes = (size + 7) // 8
+    reversed_code = int.from_bytes(
+        code.to_bytes(num_bytes, "little").translate(REVERSED_BYTES), "big"
+    )
+    return reversed_code >> (8 * num_bytes - size)
+
+
+def pack_tile(tile: Tile) -> PackedTile:
+    """Pack every row of the given tile into an int."""
+    # Convert the whole tile in one go and cut the rows out of it
+    size: int = tile.size
+    bits: int = edge_code(map("".join, tile.pixels))
+    mask: int = (1 << size) - 1
+    return PackedTile(
+        tile.tile_id,
+        size,
+        tuple(bits >> shift & mask for shift in range(size * (size - 1), -1, -size)),
+    )
+
+
+def column_code(rows: Tuple[int, ...], size: int, column: int) -> int:
+    """Return the given column (0 is leftmost) of packed rows as an int, top pixel most significant."""
+    shift: int = size - 1 - column
+    code = 0
+    for row in rows:
+        code = code << 1 | (row >> shift & 1)
+
+    return code
+
+
+def transpose_rows(rows: Tuple[int, ...], size: int) -> Tuple[int, ...]:
+    """Swap the rows and columns of the given packed rows."""
+    # Lay the rows out end to end once, every column is then a strided slice of it
+    bits: str = "".join([f"{row:0{size}b}" for row in rows])
+    return tuple(int(bits[column::size], 2) for column in range(size))
+
+
+def rotate_rows_90(rows: Tuple[int, ...], size: int) -> Tuple[int, ...]:
+    """Rotate the given packed rows 90 degrees clockwise."""
+    return transpose_rows(rows[::-1], size)
+
+
+def orient_rows(rows: Tuple[int, ...], size: int, orientation: int) -> Tuple[int, ...]:
+    """Return the packed rows in the given orientation (all_tile_orientations order) with at most one transpose."""
+    quarter_turns, flipped = divmod(orientation, 2)
+
+    if quarter_turns == 1:
+        rows = rotate_rows_90(rows, size)
+    elif quarter_turns == 2:
+        rows = tuple(reverse_bits(row, size) for row in reversed(rows))
+    elif quarter_turns == 3:
+        rows = transpose_rows(rows, size)[::-1]
+
+    return rows[::-1] if flipped else rows
+
+
+def packed_edges(tile: PackedTile) -> Tuple[int, int, int, int]:
+    """Return the (top, right, bottom, left) edge codes of the given tile."""
+    return (
+        tile.rows[0],
+        column_code(tile.rows, tile.size, tile.size - 1),
+        tile.rows[-1],
+        column_code(tile.rows, tile.size, 0),
+    )
+
+
+def orientation_edges(
+    edges: Tuple[int, int, int, int], size: int
+) -> Tuple[Tuple[int, int, int, int], ...]:
+    """Return the (top, right, bottom, left) edge codes of all 8 orientations, in all_tile_orientations order, from the edges of the unrotated tile."""
+    orientations: List[Tuple[int, int, int, int]] = []
+
+    # Carry every edge as a (code, reversed code) pair so reversing an edge is a swap
+    top, right, bottom, left = ((code, reverse_bits(code, size)) for code in edges)
+
+    for _ in range(4):
+        orientations.append((top[0], right[0], bottom[0], left[0]))
+        # A vertical flip swaps top and bottom and reverses the sides
+        orientations.append((bottom[0], right[1], top[0], left[1]))
+        # Rotating clockwise moves the left edge to the top and the bottom edge to the left
+        top, right, bottom, left = left[::-1], top, right[::-1], bottom
+
+    return tuple(orientations)
+
+
+def build_edge_index(tiles_lookup: Dict[int, Tile]) -> EdgeIndex:
+    """Pack every tile once and index each orientation by its top and left edge codes."""
+    tiles: Dict[int, PackedTile] = {}
+    edges: Dict[int, Tuple[Tuple[int, int, int, int], ...]] = {}
+    top: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    left: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+
+    for tile_id, tile in tiles_lookup.items():
+        tiles[tile_id] = pack_tile(tile)
+        edges[tile_id] = orientation_edges(packed_edges(tiles[tile_id]), tile.size)
+        for orientation, (top_code, _, _, left_code) in enumerate(edges[tile_id]):
+            top[top_code].append((tile_id, orientation))
+            left[left_code].append((tile_id, orientation))
+
+    return EdgeIndex(tiles, edges, dict(top), dict(left))
+
+
+def oriented_tile(edge_index: EdgeIndex, tile_id: int, orientation: int) -> PackedTile:
+    """Return the given orientation of an indexed tile."""
+    tile: PackedTile = edge_index.tiles[tile_id]
+    return PackedTile(
+        tile_id, tile.size, orient_rows(tile.rows, tile.size, orientation)
+    )
+
+
+def count_edge_codes(edge_index: EdgeIndex) -> Counter:
+    """Count how many tiles have an edge matching each edge code, whichever way the edge is read."""
+    return Counter(
+        code
+        for orientations in edge_index.edges.values()
+        for code in {code for edges in orientations for code in edges}
+    )
+
+
+def count_unmatched_edges(
+    tiles_lookup: Dict[int, Tile], edge_index: Optional[EdgeIndex] = None
+) -> Dict[int, int]:
+    """Return how many edges of each tile match no edge of any other tile."""
+    if edge_index is None:
+        edge_index = build_edge_index(tiles_lookup)
+    code_counts: Counter = count_edge_codes(edge_index)
+
+    return {
+        tile_id: sum(1 for code in orientations[0] if code_counts[code] == 1)
+        for tile_id, orientations in edge_index.edges.items()
+    }
+
+
+def find_corner_tiles(
+    tiles_lookup: Dict[int, Tile], edge_index: Optional[EdgeIndex] = None
+) -> Tuple[Tile, ...]:
+    """Return the tiles with two edges that match no other tile."""
+    unmatched_edges = count_unmatched_edges(tiles_lookup, edge_index)
+    return tuple(
+        tiles_lookup[tile_id]
+        for tile_id, unmatched in unmatched_edges.items()
+        if unmatched == 2
+    )
+
+
 def all_image_orientations(image: Image) -> Generator:
     """Yield all orientations of the given image."""
     yield image
@@ -177,57 +377,17 @@ def left_matching_tile(tiles_lookup: Dict[int, Tile], left_tile: Tile):
     return None
 
 
-def top_left_corner_possibilities(tiles_lookup: Dict[int, Tile], tile: Tile):
-    """From the given corner tile, check all possible orientations for a valid grid fill starting from that orientation."""
-    for top_left in all_tile_orientations(tile):
-        grid: Tuple[Tuple[Tile, ...], ...] = attempt_grid_fill(tiles_lookup, top_left)
-        if grid:
-            return grid
-
-    return None
-
-
-def attempt_grid_fill(
-    tiles_lookup: Dict[int, Tile], starting_tile: Tile
-) -> Tuple[Tuple[Tile, ...], ...]:
-    """From the given tiles in tiles_lookup and a starting tile, attempt to fill the grid from left to right, top to bottom."""
-    grid_size: int = int(len(tiles_lookup) ** 0.5)
-    grid = [[None] * grid_size for _ in range(grid_size)]
-
-    # Make a copy of our available tiles so we can mutate it and remove tiles as we place them
-    available_tiles: Dict[int, Tile] = deepcopy(tiles_lookup)
-    del available_tiles[starting_tile.tile_id]
-
-    grid[0][0] = starting_tile
-    for i, row in enumerate(grid):
-        for j, cell in enumerate(row):
-            potential_match: Tile = None
-
-            # Top left corner is prefilled, skip it
-            if (i, j) == (0, 0):
-                continue
-
-            # The very first entry in every row needs to match the tile above it
-            if j == 0:
-                top_tile = grid[i - 1][j]
-                potential_match = top_matching_tile(available_tiles, top_tile)
-            # All other entries must match the right edge of the tile to the left
-            else:
-                left_tile = grid[i][j - 1]
-                potential_match = left_matching_tile(available_tiles, left_tile)
-
-            if potential_match:
-                grid[i][j] = potential_match
-                del available_tiles[potential_match.tile_id]
-            else:
-                # Unable to find a matching tile for the given grid cell
-                return None
-
-    return tuple(tuple(row) for row in grid)
-
-
-def remove_tile_borders(tile: Tile) -> Tile:
+def remove_tile_borders(tile: Union[Tile, PackedTile]) -> Union[Tile, PackedTile]:
     """Return a new tile with the borders of the original tile removed."""
+    if isinstance(tile, PackedTile):
+        # Drop the rightmost bit and mask off the leftmost one
+        inner_mask: int = (1 << (tile.size - 2)) - 1
+        return PackedTile(
+            tile.tile_id,
+            tile.size - 2,
+            tuple(row >> 1 & inner_mask for row in tile.rows[1:-1]),
+        )
+
     new_pixels = []
 
     # From the 2nd row to the 2nd to last row
@@ -256,8 +416,39 @@ def grab_corner_tiles(grid: Tuple[Tile, ...]):
     return (grid[0][0], grid[0][-1], grid[-1][-1], grid[-1][0])
 
 
+def unpack_rows(
+    rows: Tuple[int, ...], size: int, on: str = "#", off: str = "."
+) -> Tuple[Tuple[str, ...], ...]:
+    """Turn packed rows back into a pixel grid."""
+    return tuple(
+        tuple(f"{row:0{size}b}".replace("1", on).replace("0", off)) for row in rows
+    )
+
+
+def stitch_packed_tiles(grid: Tuple[Tuple[PackedTile, ...], ...]) -> PackedImage:
+    """Remove the border of each packed tile and concatenate the tile rows into one packed image."""
+    trimmed_grid = remove_borders(grid)
+    tile_size: int = trimmed_grid[0][0].size
+
+    image_rows: List[int] = []
+    for grid_row in trimmed_grid:
+        for i in range(tile_size):
+            image_row = 0
+            for tile in grid_row:
+                image_row = image_row << tile_size | tile.rows[i]
+            image_rows.append(image_row)
+
+    return PackedImage(tile_size * len(trimmed_grid[0]), tuple(image_rows))
+
+
 def stitch_tiles(grid: Tuple[Tuple[Tile, ...], ...]) -> Image:
     """Take the given grid of tiles, remove the border of each tile, and assemble them into one image."""
+    if isinstance(grid[0][0], PackedTile):
+        packed_image: PackedImage = stitch_packed_tiles(grid)
+        return Image(
+            packed_image.size, unpack_rows(packed_image.rows, packed_image.size)
+        )
+
     trimmed_grid = remove_borders(grid)
     image_size = len(trimmed_grid[0][0].pixels) * len(trimmed_grid[0])
 
@@ -275,80 +466,338 @@ def stitch_tiles(grid: Tuple[Tuple[Tile, ...], ...]) -> Image:
     return Image(image_size, tuple(tuple(row) for row in image_pixels))
 
 
-def fill_grid(tiles_lookup: Dict[int, Tile]):
+def placement_candidates(
+    grid_size: int,
+    placed: List[Tuple[int, int]],
+    available: Set[int],
+    edge_index: EdgeIndex,
+    unmatched: Set[int],
+) -> List[Tuple[int, int]]:
+    """Return every (tile_id, orientation) that fits the next free cell given its left and top neighbors and the outer border."""
+    i, j = divmod(len(placed), grid_size)
+    above = (
+        edge_index.edges[placed[-grid_size][0]][placed[-grid_size][1]] if i else None
+    )
+    left = edge_index.edges[placed[-1][0]][placed[-1][1]] if j else None
+
+    if left:
+        pool = edge_index.left.get(left[1], ())
+    elif above:
+        pool = edge_index.top.get(above[2], ())
+    else:
+        # The top left cell can only hold a corner, one with two unmatched edges
+        pool = (
+            (tile_id, orientation)
+            for tile_id, orientations in edge_index.edges.items()
+            if sum(1 for code in orientations[0] if code in unmatched) == 2
+            for orientation in range(len(orientations))
+        )
+
+    candidates: List[Tuple[int, int]] = []
+    for tile_id, orientation in pool:
+        if tile_id not in available:
+            continue
+
+        top, right, bottom, left_code = edge_index.edges[tile_id][orientation]
+        if above and top != above[2]:
+            continue
+
+        # Edges on the outside of the grid must not match any other tile
+        outer = (
+            (i == 0, top),
+            (j == 0, left_code),
+            (j == grid_size - 1, right),
+            (i == grid_size - 1, bottom),
+        )
+        if all(code in unmatched for on_border, code in outer if on_border):
+            candidates.append((tile_id, orientation))
+
+    return candidates
+
+
+def assemble_grid(
+    tiles_lookup: Dict[int, Tile], edge_index: Optional[EdgeIndex] = None
+):
+    """Assemble the tiles left to right, top to bottom from a corner, backtracking only when more than one tile fits a cell."""
+    if edge_index is None:
+        edge_index = build_edge_index(tiles_lookup)
+    code_counts: Counter = count_edge_codes(edge_index)
+
+    # Every edge code, read either way, that appears on only one tile
+    unmatched: Set[int] = {code for code, count in code_counts.items() if count == 1}
+    grid_size: int = math.isqrt(len(tiles_lookup))
+
+    placed: List[Tuple[int, int]] = []
+    available: Set[int] = set(tiles_lookup)
+
+    # One iterator of remaining candidates per filled cell plus the cell being filled
+    pending = [
+        iter(placement_candidates(grid_size, placed, available, edge_index, unmatched))
+    ]
+    while pending:
+        placement = next(pending[-1], None)
+
+        if placement is None:
+            # Nothing else fits this cell, undo the previous placement and try its next candidate
+            pending.pop()
+            if placed:
+                available.add(placed.pop()[0])
+            continue
+
+        placed.append(placement)
+        available.remove(placement[0])
+
+        if not available:
+            tiles = [oriented_tile(edge_index, *placement) for placement in placed]
+            return tuple(
+                tuple(tiles[row : row + grid_size])
+                for row in range(0, len(tiles), grid_size)
+            )
+
+        pending.append(
+            iter(
+                placement_candidates(
+                    grid_size, placed, available, edge_index, unmatched
+                )
+            )
+        )
+
+    return None
+
+
+def fill_grid(tiles_lookup: Dict[int, Tile], edge_index: Optional[EdgeIndex] = None):
     """Return a solved grid if possible from the given tiles."""
-    for tile in tiles_lookup.values():
-        grid = top_left_corner_possibilities(tiles_lookup, tile)
-        if grid:
-            return grid
+    return assemble_grid(tiles_lookup, edge_index)
 
 
-def count_monsters(image: Image, monster_pixel="#") -> int:
-    """Return the number of monsters contained in the given image."""
-    # Hard coded shape of our monster
-    monster_point_offsets = [
-        (0, 18),
-        (1, 0),
-        (1, 5),
-        (1, 6),
-        (1, 11),
-        (1, 12),
-        (1, 17),
-        (1, 18),
-        (1, 19),
-        (2, 1),
-        (2, 4),
-        (2, 7),
-        (2, 10),
-        (2, 13),
-        (2, 16),
+def build_pattern(raw_pattern: str, pixel: str = "#") -> Pattern:
+    """Build a Pattern from ASCII art where pixel marks the points that must be set, anything else is ignored."""
+    lines: List[str] = raw_pattern.split("\n")
+    width: int = max(len(line) for line in lines)
+
+    rows = tuple(
+        int("".join("1" if char == pixel else "0" for char in line.ljust(width)), 2)
+        for line in lines
+    )
+    return Pattern(width, rows)
+
+
+def find_pattern(image: PackedImage, pattern: Pattern) -> List[Tuple[int, int]]:
+    """Return the (row, column) of the top left corner of every placement of pattern in the image."""
+    size: int = image.size
+    height: int = len(pattern.rows)
+    if pattern.width > size or height > size:
+        return []
+
+    full_mask: int = (1 << size) - 1
+    # Bits of the columns a pattern can start at without running off the right edge
+    start_mask: int = full_mask ^ ((1 << (pattern.width - 1)) - 1)
+
+    # Offset of every set pixel from the left edge of each pattern row
+    offsets: List[Tuple[int, ...]] = [
+        tuple(
+            column
+            for column in range(pattern.width)
+            if pattern_row >> (pattern.width - 1 - column) & 1
+        )
+        for pattern_row in pattern.rows
     ]
 
-    # Monsters occupy 3 rows and 21 columns
-    monster_length: int = 3
-    monster_width: int = 21
+    placements: List[Tuple[int, int]] = []
+    for top in range(size - height + 1):
+        # Shifting an image row left by a pixel's offset lines that pixel up with the start column of the pattern
+        starts: int = start_mask
+        for image_row, pixel_offsets in zip(image.rows[top:], offsets):
+            for offset in pixel_offsets:
+                starts &= image_row << offset
+            if not starts:
+                break
+
+        while starts:
+            bit: int = starts.bit_length() - 1
+            placements.append((top, size - 1 - bit))
+            starts ^= 1 << bit
+
+    return placements
+
+
+def orient_image(image: PackedImage, orientation: int) -> PackedImage:
+    """Return the image in the given orientation (all_image_orientations order)."""
+    return PackedImage(image.size, orient_rows(image.rows, image.size, orientation))
+
+
+def scan_orientations(
+    image: PackedImage, pattern: Pattern
+) -> Tuple[List[Tuple[int, int]], ...]:
+    """Return the placements of pattern in each of the 8 orientations of the image."""
+    return tuple(
+        find_pattern(orient_image(image, orientation), pattern)
+        for orientation in range(8)
+    )
+
+
+def roughness(
+    image: PackedImage, pattern: Pattern, placements: List[Tuple[int, int]]
+) -> int:
+    """Count the set pixels in the image that are not covered by any of the given pattern placements."""
+    covered: List[int] = [0] * image.size
+    for top, left in placements:
+        shift: int = image.size - pattern.width - left
+        for idx, pattern_row in enumerate(pattern.rows):
+            covered[top + idx] |= pattern_row << shift
+
+    return sum(bin(row & ~mask).count("1") for row, mask in zip(image.rows, covered))
+
+
+def pattern_pixels(pattern: Pattern) -> List[Tuple[int, int]]:
+    """Return the (row, column) of every set pixel in the pattern."""
+    return [
+        (row, column)
+        for row, pattern_row in enumerate(pattern.rows)
+        for column in range(pattern.width)
+        if pattern_row >> (pattern.width - 1 - column) & 1
+    ]
 
-    # Iterate through our image and look for monsters, no need to search points that are too close to the edges
-    monster_count = 0
-    for i, row in enumerate(image.pixels[:-monster_length]):
-        for j, pixel in enumerate(row[:-monster_width]):
-            if all(
-                image.pixels[x + i][y + j] == monster_pixel
-                for x, y in monster_point_offsets
-            ):
-                monster_count += 1
 
-    return monster_count
+def stitch_to_buffer(
+    grid: Tuple[Tuple[PackedTile, ...], ...], path: Optional[str] = None
+):
+    """Write the trimmed rows of every packed tile straight into a preallocated uint8 image, memory mapped to path if given."""
+    import numpy as np
 
+    tile_size: int = grid[0][0].size
+    inner: int = tile_size - 2
+    size: int = inner * len(grid[0])
 
-def find_correct_image_orientation(grid):
-    """Search the different orientations of the grid of tiles until we find one that contains monsters."""
-    image = stitch_tiles(grid)
-    for test_image in all_image_orientations(image):
-        count = count_monsters(test_image)
-        if count > 0:
-            return test_image, count
+    if path:
+        buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size, size))
+    else:
+        buffer = np.zeros((size, size), dtype=np.uint8)
+
+    # Rows are padded to whole bytes on the left, skip the padding and the border columns 0 and tile_size - 1
+    row_bytes: int = (tile_size + 7) // 8
+    first_column: int = 8 * row_bytes - tile_size + 1
+
+    # Unpack one grid row at a time so the working set stays a single grid row of the image
+    for i, grid_row in enumerate(grid):
+        packed = b"".join(
+            packed_row.to_bytes(row_bytes, "big")
+            for tile in grid_row
+            for packed_row in tile.rows[1:-1]
+        )
+        bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8)).reshape(
+            len(grid_row), inner, 8 * row_bytes
+        )[..., first_column : first_column + inner]
+
+        # View the rows of the buffer as (image row, tile, tile column) and lay the tiles out side by side
+        rows = buffer[i * inner : (i + 1) * inner].reshape(inner, len(grid_row), inner)
+        rows[:] = bits.transpose(1, 0, 2)
+
+    if path:
+        buffer.flush()
+
+    return buffer
+
+
+def buffer_orientation(buffer, orientation: int):
+    """Return a view of the image buffer in the given orientation (all_image_orientations order) without copying it."""
+    import numpy as np
+
+    quarter_turns, flipped = divmod(orientation, 2)
+    view = np.rot90(buffer, -quarter_turns)
+
+    return view[::-1] if flipped else view
+
+
+def find_pattern_in_buffer(view, pattern: Pattern) -> List[Tuple[int, int]]:
+    """Return the (row, column) of the top left corner of every placement of pattern in the image buffer view."""
+    import numpy as np
+
+    height: int = len(pattern.rows)
+    rows: int = view.shape[0] - height + 1
+    columns: int = view.shape[1] - pattern.width + 1
+    if rows <= 0 or columns <= 0:
+        return []
+
+    # Slide the image under every pattern pixel at once, a placement survives only if all of them land on set pixels
+    hits = np.ones((rows, columns), dtype=bool)
+    for row, column in pattern_pixels(pattern):
+        hits &= view[row : row + rows, column : column + columns] != 0
+
+    return [(int(row), int(column)) for row, column in np.argwhere(hits)]
+
+
+def buffer_roughness(view, pattern: Pattern, placements: List[Tuple[int, int]]) -> int:
+    """Count the set pixels in the image buffer view that are not covered by any of the given pattern placements."""
+    import numpy as np
+
+    covered = np.zeros(view.shape, dtype=bool)
+    for top, left in placements:
+        for row, column in pattern_pixels(pattern):
+            covered[top + row, left + column] = True
+
+    return int(np.count_nonzero(view)) - int(np.count_nonzero(view[covered]))
+
+
+def find_correct_buffer_orientation(buffer, raw_pattern: str = SEA_MONSTER):
+    """Scan every orientation view of the image buffer and return the first one containing the pattern along with its placements."""
+    pattern: Pattern = build_pattern(raw_pattern)
+
+    for orientation in range(8):
+        view = buffer_orientation(buffer, orientation)
+        placements = find_pattern_in_buffer(view, pattern)
+        if placements:
+            return view, placements
+
+    return None, None
+
+
+def count_monsters(image: Image, monster_pixel="#") -> int:
+    """Return the number of monsters contained in the given image."""
+    packed_image = PackedImage(
+        image.size, tuple(edge_code(row, monster_pixel) for row in image.pixels)
+    )
+    return len(find_pattern(packed_image, build_pattern(SEA_MONSTER)))
+
+
+def find_correct_image_orientation(grid, raw_pattern: str = SEA_MONSTER):
+    """Scan every orientation of the stitched grid of tiles and return the first oriented image containing the pattern along with its placements."""
+    image: PackedImage = stitch_packed_tiles(grid)
+    pattern: Pattern = build_pattern(raw_pattern)
+
+    for orientation, placements in enumerate(scan_orientations(image, pattern)):
+        if placements:
+            return orient_image(image, orientation), placements
 
     return None, None
 
 
 if __name__ == "__main__":
     filename = sys.argv[1]
+    # Optionally stitch the image into a memory mapped file at the given path
+    buffer_path = sys.argv[2] if len(sys.argv) > 2 else None
     tiles_lookup = build_tiles(filename)
 
-    grid = fill_grid(tiles_lookup)
+    # Pack and index the tiles once for both parts
+    edge_index = build_edge_index(tiles_lookup)
 
-    corner_tiles = grab_corner_tiles(grid)
+    # Corners are the only tiles with two unmatched edges, no need to assemble the grid for part 1
+    corner_tiles = find_corner_tiles(tiles_lookup, edge_index)
     assert len(corner_tiles) == 4
 
     answer = reduce(lambda total, tile: total * tile.tile_id, corner_tiles, 1)
     print(f"Part 1: Corner Tile Product {answer}")
 
-    correct_image, monster_count = find_correct_image_orientation(grid)
+    grid = fill_grid(tiles_lookup, edge_index)
 
-    # Count the number of pound signs in the image that are not part of a sea monster
-    pound_count = reduce(
-        lambda total, row: total + row.count("#"), correct_image.pixels, 0
-    )
-    answer = pound_count - monster_count * 15
-    print(f"Part 2: answer={answer}")
\ No newline at end of file
+    if buffer_path:
+        # Keep the image in a memory mapped uint8 buffer instead of Python ints
+        buffer = stitch_to_buffer(grid, buffer_path)
+        view, placements = find_correct_buffer_orientation(buffer)
+        answer = buffer_roughness(view, build_pattern(SEA_MONSTER), placements)
+    else:
+        correct_image, placements = find_correct_image_orientation(grid)
+
+        # Count the number of pound signs in the image that are not part of a sea monster
+        answer = roughness(correct_image, build_pattern(SEA_MONSTER), placements)
+    print(f"Part 2: answer={answer}")
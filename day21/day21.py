@@ -1,5 +1,6 @@
 import sys
-from typing import NamedTuple, Tuple, List, Dict, Set
+from collections import deque
+from typing import NamedTuple, Tuple, List, Dict, Deque, Iterable
 
 
 class Food(NamedTuple):
@@ -7,6 +8,27 @@ class Food(NamedTuple):
     allergens: Tuple[str, ...]
 
 
+class FoodIndex(NamedTuple):
+    # Interned names, an ingredient or allergen id is its position in these lists
+    ingredient_names: List[str]
+    allergen_names: List[str]
+    # Bitmask of ingredient ids in each food
+    food_masks: List[int]
+    # Allergen id -> ids of every food that contains it
+    allergen_foods: List[List[int]]
+    # Ingredient id -> number of foods it appears in
+    ingredient_counts: List[int]
+
+
+class FoodTally(NamedTuple):
+    ingredient_names: List[str]
+    allergen_names: List[str]
+    # Ingredient id -> number of foods it appears in
+    ingredient_counts: List[int]
+    # Allergen id -> bitmask of the ingredients in every food seen so far that contains it
+    allergen_candidates: List[int]
+
+
 def parse_food(line: str) -> Food:
     """Return a valid Food from the given line."""
     left, right = line.strip().split(" (contains ")
@@ -51,46 +73,172 @@ def collect_unknown_ingredients(
     return unique_ingredients
 
 
-def decode_allergens(foods: Tuple[Food, ...]) -> Dict[str, str]:
-    """Populate our decoded allergens by searching for foods that contain an allergen and exactly 1 unknown ingredient."""
-    allergens: Set[str] = set(allergen for food in foods for allergen in food.allergens)
+def intern(name: str, ids: Dict[str, int], names: List[str]) -> int:
+    """Return the id of name, assigning the next free id the first time it is seen."""
+    if name not in ids:
+        ids[name] = len(names)
+        names.append(name)
+
+    return ids[name]
+
+
+def count_ingredients(
+    ingredients: Iterable[str],
+    ingredient_ids: Dict[str, int],
+    ingredient_names: List[str],
+    ingredient_counts: List[int],
+) -> int:
+    """Intern and count each ingredient of a food and return the bitmask of their ids."""
+    mask = 0
+    for ingredient in ingredients:
+        ingredient_id = intern(ingredient, ingredient_ids, ingredient_names)
+        if ingredient_id == len(ingredient_counts):
+            ingredient_counts.append(0)
+        ingredient_counts[ingredient_id] += 1
+        mask |= 1 << ingredient_id
+
+    return mask
+
+
+def build_food_index(foods: Tuple[Food, ...]) -> FoodIndex:
+    """Intern every ingredient and allergen and index the foods by allergen."""
+    ingredient_ids: Dict[str, int] = {}
+    allergen_ids: Dict[str, int] = {}
+    index = FoodIndex([], [], [], [], [])
+
+    for food_id, food in enumerate(foods):
+        mask = count_ingredients(
+            food.ingredients,
+            ingredient_ids,
+            index.ingredient_names,
+            index.ingredient_counts,
+        )
+        index.food_masks.append(mask)
+
+        for allergen in food.allergens:
+            allergen_id = intern(allergen, allergen_ids, index.allergen_names)
+            if allergen_id == len(index.allergen_foods):
+                index.allergen_foods.append([])
+            index.allergen_foods[allergen_id].append(food_id)
+
+    return index
+
+
+def candidate_masks(index: FoodIndex) -> List[int]:
+    """Return a bitmask per allergen of the ingredients found in every food containing that allergen."""
+    candidates: List[int] = []
+
+    for food_ids in index.allergen_foods:
+        mask = index.food_masks[food_ids[0]]
+        for food_id in food_ids[1:]:
+            mask &= index.food_masks[food_id]
+        candidates.append(mask)
+
+    return candidates
+
+
+def resolve_candidates(candidates: List[int]) -> Dict[int, int]:
+    """Resolve {allergen_id: ingredient_id} by repeatedly assigning allergens with exactly one candidate ingredient."""
+    candidates = list(candidates)
+    resolved: Dict[int, int] = {}
+
+    # A power of two has exactly one candidate
+    queue: Deque[int] = deque(
+        allergen_id
+        for allergen_id, mask in enumerate(candidates)
+        if mask and mask & (mask - 1) == 0
+    )
+
+    while queue:
+        allergen_id = queue.popleft()
+        mask = candidates[allergen_id]
+        if allergen_id in resolved or not mask:
+            continue
+
+        resolved[allergen_id] = mask.bit_length() - 1
+
+        # The ingredient is taken, drop it from every other allergen and queue whichever become certain
+        for other_id, other_mask in enumerate(candidates):
+            if other_id != allergen_id and other_mask & mask:
+                other_mask &= ~mask
+                candidates[other_id] = other_mask
+                if other_mask and other_mask & (other_mask - 1) == 0:
+                    queue.append(other_id)
+
+    if len(resolved) < len(candidates):
+        raise ValueError("Allergens can't all be matched to a single ingredient")
+
+    return resolved
 
-    decoded_allergens: Dict[str, str] = {}
 
-    # To decode our allergens, iterate through the allergens until we can find a set intersection of ingredients for that allergen that has exactly one commonality
-    while len(decoded_allergens) < len(allergens):
-        for allergen in allergens:
-            unknown_ingredients: List[List[str]] = collect_unknown_ingredients(
-                decoded_allergens, foods, allergen
-            )
+def ingest_foods(lines: Iterable[str]) -> FoodTally:
+    """Tally food lines one at a time, keeping only per ingredient counts and per allergen running intersections."""
+    ingredient_ids: Dict[str, int] = {}
+    allergen_ids: Dict[str, int] = {}
+    tally = FoodTally([], [], [], [])
 
-            # Can't pass a generator expression, make a tuple of sets and then explode it
-            intersecting_ingredients = set.intersection(
-                *tuple(set(ingredients) for ingredients in unknown_ingredients)
-            )
+    for line in lines:
+        if not line.strip():
+            continue
 
-            if len(intersecting_ingredients) == 1:
-                decoded_allergens[allergen] = intersecting_ingredients.pop()
+        food: Food = parse_food(line)
 
-    return decoded_allergens
+        mask = count_ingredients(
+            food.ingredients,
+            ingredient_ids,
+            tally.ingredient_names,
+            tally.ingredient_counts,
+        )
+
+        for allergen in food.allergens:
+            allergen_id = intern(allergen, allergen_ids, tally.allergen_names)
+            if allergen_id == len(tally.allergen_candidates):
+                tally.allergen_candidates.append(mask)
+            else:
+                tally.allergen_candidates[allergen_id] &= mask
+
+    return tally
+
+
+def count_safe_ingredients(ingredient_counts: List[int], candidates: List[int]) -> int:
+    """Count the appearances of every ingredient that can't contain any allergen."""
+    unsafe = 0
+    for mask in candidates:
+        unsafe |= mask
+
+    return sum(
+        count
+        for ingredient_id, count in enumerate(ingredient_counts)
+        if not unsafe >> ingredient_id & 1
+    )
+
+
+def decode_allergens(foods: Tuple[Food, ...]) -> Dict[str, str]:
+    """Match every allergen to the single ingredient that contains it."""
+    index: FoodIndex = build_food_index(foods)
+    resolved: Dict[int, int] = resolve_candidates(candidate_masks(index))
+
+    return {
+        index.allergen_names[allergen_id]: index.ingredient_names[ingredient_id]
+        for allergen_id, ingredient_id in resolved.items()
+    }
 
 
 if __name__ == "__main__":
     filename = sys.argv[1]
 
-    contents = open(filename).readlines()
+    # Stream the foods, only the counts and candidate intersections are kept
+    tally: FoodTally = ingest_foods(open(filename))
+    candidates: List[int] = tally.allergen_candidates
 
-    foods: Tuple[Food, ...] = tuple(parse_food(line) for line in contents)
-    decoded_allergens: Dict[str, str] = decode_allergens(foods)
-    answer: int = sum(
-        1
-        for food in foods
-        for ingredient in food.ingredients
-        if ingredient not in decoded_allergens.values()
-    )
+    answer: int = count_safe_ingredients(tally.ingredient_counts, candidates)
+    decoded_allergens: Dict[str, str] = {
+        tally.allergen_names[allergen_id]: tally.ingredient_names[ingredient_id]
+        for allergen_id, ingredient_id in resolve_candidates(candidates).items()
+    }
 
     dangerous_ingredients: str = ",".join(
         v for k, v in sorted(decoded_allergens.items())
     )
     print(f"Part 1: answer= {answer}")
-    print(f"Part 2: dangerous_ingredients= {dangerous_ingredients}")
\ No newline at end of file
+    print(f"Part 2: dangerous_ingredients= {dangerous_ingredients}")
@@ -1,8 +1,29 @@
 import sys
+import random
+from array import array
 from collections import deque
-from typing import Deque, Tuple, NamedTuple
-from copy import copy, deepcopy
-from pprint import pprint
+from functools import lru_cache
+from typing import (
+    Deque,
+    Tuple,
+    NamedTuple,
+    Dict,
+    List,
+    Set,
+    Iterator,
+    Iterable,
+    Optional,
+)
+
+# Polynomial rolling hash over the cards, top of the deck first. The base is
+# a random odd number drawn per run so that no fixed pair of decks collides
+HASH_BITS = 61
+HASH_MODULUS = (1 << HASH_BITS) - 1
+HASH_BASE = random.randrange(1 << 32, HASH_MODULUS) | 1
+HASH_BASE_SQUARED = HASH_BASE * HASH_BASE % HASH_MODULUS
+
+# Array typecodes able to hold the cards, smallest first
+CARD_TYPECODES = ("B", "H", "I")
 
 
 class Deck(NamedTuple):
@@ -10,6 +31,90 @@ class Deck(NamedTuple):
     winning: bool
 
 
+class CompactDeck:
+    """Deck stored in a fixed size circular array with a rolling hash of its cards."""
+
+    __slots__ = ("buffer", "capacity", "head", "size", "powers", "hash")
+
+    def __init__(self, cards: bytes, capacity: int, typecode: str = "B"):
+        """Build a deck from the raw bytes of an array of the given typecode."""
+        self.buffer = array(typecode)
+        self.buffer.frombytes(cards)
+        self.capacity = capacity
+        self.head = 0
+        self.size = len(self.buffer)
+        self.powers = hash_powers(capacity)
+
+        card_hash = 0
+        for card in self.buffer:
+            card_hash = (card_hash * HASH_BASE + card) % HASH_MODULUS
+        self.hash = card_hash
+
+        self.buffer.frombytes(bytes((capacity - self.size) * self.buffer.itemsize))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[int]:
+        end = self.head + self.size
+        if end <= self.capacity:
+            return iter(self.buffer[self.head : end])
+        return iter(self.buffer[self.head :] + self.buffer[: end - self.capacity])
+
+    def popleft(self) -> int:
+        """Remove and return the top card, dropping its term from the hash."""
+        head = self.head
+        card = self.buffer[head]
+        head += 1
+        self.head = 0 if head == self.capacity else head
+        self.size -= 1
+        self.hash = (self.hash - card * self.powers[self.size]) % HASH_MODULUS
+        return card
+
+    def put_bottom(self, first: int, second: int) -> None:
+        """Put both cards on the bottom of the deck, in order, shifting them into the hash."""
+        tail = self.head + self.size
+        if tail >= self.capacity:
+            tail -= self.capacity
+        self.buffer[tail] = first
+        tail += 1
+        if tail == self.capacity:
+            tail = 0
+        self.buffer[tail] = second
+        self.size += 2
+        self.hash = (
+            self.hash * HASH_BASE_SQUARED + first * HASH_BASE + second
+        ) % HASH_MODULUS
+
+    def to_bytes(self, num_cards: Optional[int] = None) -> bytes:
+        """Return the raw bytes of the top num_cards cards (or the whole deck) as a slice copy of the buffer."""
+        if num_cards is None:
+            num_cards = self.size
+        end = self.head + num_cards
+        if end <= self.capacity:
+            return self.buffer[self.head : end].tobytes()
+        return (
+            self.buffer[self.head :].tobytes()
+            + self.buffer[: end - self.capacity].tobytes()
+        )
+
+
+class GameFrame(NamedTuple):
+    cards1: CompactDeck
+    cards2: CompactDeck
+    # Hashes of every (deck1, deck2) pair seen in this game
+    history: Set[int]
+    # Starting decks, used to memoize the winner of sub games
+    start: Tuple[bytes, bytes]
+
+
+class GameResult(NamedTuple):
+    player1: Deck
+    player2: Deck
+    games: int
+    rounds: int
+
+
 def build_decks(filename):
     """Build each players decks from the given file."""
     first_deck, second_deck = open(filename).read().split("\n\n")
@@ -41,44 +146,137 @@ def play_game(player1_deck: Deck, player2_deck: Deck) -> int:
     return score_decks(player1_deck, player2_deck)
 
 
-def decks_in_history(history, deck1, deck2):
-    return tuple(deck1) in history or tuple(deck2) in history
+@lru_cache(maxsize=None)
+def hash_powers(capacity: int) -> Tuple[int, ...]:
+    """Return HASH_BASE ** n for every deck size up to capacity."""
+    return tuple(pow(HASH_BASE, size, HASH_MODULUS) for size in range(capacity + 1))
 
 
-def copy_n_cards(deck: Deck, num_cards):
-    return Deck(deck.cards[:num_cards], deck.winning)
+def card_typecode(cards: Iterable[int]) -> str:
+    """Return the smallest array typecode able to hold every card."""
+    largest = max(cards, default=0)
+    for typecode in CARD_TYPECODES:
+        if largest < 1 << 8 * array(typecode).itemsize:
+            return typecode
 
+    raise ValueError(f"Card {largest} is too large to fit in a compact deck")
 
-def recursive_game(player1_deck: Deck, player2_deck: Deck, history=set()):
 
-    if decks_in_history(history, player1_deck.cards, player2_deck.cards):
-        # player 1 wins
-        return Deck(player1_deck.cards, True), Deck(player2_deck.cards, False)
+def state_hash(deck1: CompactDeck, deck2: CompactDeck) -> int:
+    """Combine both rolling hashes into a single key for the game history."""
+    return deck1.hash << HASH_BITS | deck2.hash
 
-    history.add(tuple(player1_deck.cards))
-    history.add(tuple(player2_deck.cards))
 
-    player1_card = player1_deck.cards.popleft()
-    player2_card = player2_deck.cards.popleft()
+def decks_in_history(history: Set[int], deck1: CompactDeck, deck2: CompactDeck):
+    return state_hash(deck1, deck2) in history
+
+
+def copy_n_cards(deck: CompactDeck, num_cards: int) -> bytes:
+    return deck.to_bytes(num_cards)
 
-    if (
-        len(player1_deck.cards) >= player1_card
-        and len(player2_deck.cards) >= player1_card
-    ):
-        # Recurse
-        player1_deck_copy = copy_n_cards(player1_deck, player1_card)
-        player2_deck_copy = copy_n_cards(player2_deck, player2_card)
-        return recursive_game(player1_deck_copy, player2_deck_copy, history)
-    elif player1_card > player2_card:
-        # player 1 wins
-        player1_deck.cards.append(player1_card)
-        player1_deck.cards.append(player2_card)
-        return Deck(player1_deck.cards, True), Deck(player2_deck.cards, False)
-    else:
-        # player 2 wins
-        player2_deck.cards.append(player2_card)
-        player2_deck.cards.append(player1_card)
-        return Deck(player1_deck.cards, False), Deck(player2_deck.cards, True)
+
+def start_game(cards1: bytes, cards2: bytes, typecode: str = "B") -> GameFrame:
+    """Return a fresh game starting from the raw bytes of both decks."""
+    capacity = (len(cards1) + len(cards2)) // array(typecode).itemsize
+    return GameFrame(
+        CompactDeck(cards1, capacity, typecode),
+        CompactDeck(cards2, capacity, typecode),
+        set(),
+        (cards1, cards2),
+    )
+
+
+def recursive_game(player1_deck: Deck, player2_deck: Deck) -> GameResult:
+    """Play Recursive Combat to the end and return the final decks with the number of games and rounds played.
+
+    Sub games are played on an explicit stack rather than by recursion, and their winners are memoized by starting decks.
+    """
+    winners: Dict[Tuple[bytes, bytes], int] = {}
+    games = 1
+    rounds = 0
+
+    # Sub games only ever hold cards of their parent, so one typecode fits every game
+    typecode = card_typecode([*player1_deck.cards, *player2_deck.cards])
+    stack: List[GameFrame] = [
+        start_game(
+            array(typecode, player1_deck.cards).tobytes(),
+            array(typecode, player2_deck.cards).tobytes(),
+            typecode,
+        )
+    ]
+    # Cards each unfinished game drew for the round waiting on a sub game
+    drawn: List[Tuple[int, int]] = []
+    sub_game_winner = 0
+
+    while stack:
+        game = stack[-1]
+        cards1, cards2, history = game.cards1, game.cards2, game.history
+        winner = 0
+
+        if sub_game_winner:
+            # Finish the round that started the sub game which just ended
+            round_winner, sub_game_winner = sub_game_winner, 0
+            player1_card, player2_card = drawn.pop()
+            if round_winner == 1:
+                cards1.put_bottom(player1_card, player2_card)
+            else:
+                cards2.put_bottom(player2_card, player1_card)
+
+        draw1, draw2 = cards1.popleft, cards2.popleft
+        take1, take2 = cards1.put_bottom, cards2.put_bottom
+
+        while cards1.size and cards2.size:
+            # Inlined state_hash, this runs once per round
+            state = cards1.hash << HASH_BITS | cards2.hash
+            if state in history:
+                # Repeated decks end the game in favor of player 1
+                winner = 1
+                break
+            history.add(state)
+            rounds += 1
+
+            player1_card = draw1()
+            player2_card = draw2()
+
+            if cards1.size >= player1_card and cards2.size >= player2_card:
+                start = (
+                    copy_n_cards(cards1, player1_card),
+                    copy_n_cards(cards2, player2_card),
+                )
+                if start not in winners:
+                    drawn.append((player1_card, player2_card))
+                    stack.append(start_game(*start, typecode))
+                    games += 1
+                    break
+                round_winner = winners[start]
+            else:
+                round_winner = 1 if player1_card > player2_card else 2
+
+            if round_winner == 1:
+                take1(player1_card, player2_card)
+            else:
+                take2(player2_card, player1_card)
+        else:
+            winner = 1 if cards1.size else 2
+
+        if not winner:
+            # A sub game was pushed, play it first
+            continue
+
+        stack.pop()
+        winners[game.start] = winner
+
+        if not stack:
+            return GameResult(
+                Deck(deque(cards1), winner == 1),
+                Deck(deque(cards2), winner == 2),
+                games,
+                rounds,
+            )
+
+        sub_game_winner = winner
+
+    raise ValueError("No game was played")
 
 
 def score_decks(player1_deck: Deck, player2_deck: Deck) -> int:
@@ -101,6 +299,9 @@ if __name__ == "__main__":
     print(f"Part 1 winning score= {score}")
 
     player1, player2 = build_decks(filename)
-    player1, player2 = recursive_game(player1, player2)
-    pprint(player1)
-    pprint(player2)
\ No newline at end of file
+    result: GameResult = recursive_game(player1, player2)
+    score = score_decks(result.player1, result.player2)
+
+    print(
+        f"Part 2 winning score= {score} ({result.games} games, {result.rounds} rounds)"
+    )
@@ -1,7 +1,31 @@
+import os
 import sys
-from typing import Deque, Tuple
+import glob
+import mmap
+import time
+import struct
+from array import array
+from contextlib import contextmanager
+from typing import Deque, Tuple, Sequence, NamedTuple, Union, Iterator
 from collections import deque
 
+PART1_MOVES = 100
+PART2_CUPS = 1_000_000
+PART2_MOVES = 10_000_000
+
+# Snapshot header: magic, moves played, current cup, number of cups
+SNAPSHOT_HEADER = struct.Struct("<4sQQQ")
+SNAPSHOT_MAGIC = b"D23S"
+SNAPSHOT_INTERVAL = 1_000_000
+
+
+class Snapshot(NamedTuple):
+    moves: int
+    current_cup: int
+    cup_count: int
+    # Successor table read straight from the snapshot file
+    successors: memoryview
+
 
 def pickup_cups(
     cups: Tuple[int, ...], current_cup_idx: int, qty: int = 3
@@ -63,29 +87,201 @@ def make_move(cups: Tuple[int, ...], current_cup_idx: int = 0):
     return new_cups
 
 
-def make_n_moves(moves: 10, cups):
-    current_cup_idx = 0
+def build_successors(cups: Sequence[int], cup_count: int = 0) -> array:
+    """Return the circle as a table of the cup clockwise of each label.
 
-    for _ in range(1, moves + 1):
-        cups = make_move(cups, current_cup_idx)
-        current_cup_idx += 1
-        if current_cup_idx >= len(cups):
-            current_cup_idx = 0
+    Cups labelled after the highest given label are added in order until there are cup_count cups.
+    Index 0 is unused so labels index the table directly, 4 bytes per cup.
+    """
+    cup_count = max(cup_count, len(cups))
+    # Start with every cup followed by the next label, then relink the given cups
+    successors = array("I", range(1, cup_count + 2))
+    for label, next_label in zip(cups, cups[1:]):
+        successors[label] = next_label
+
+    if cup_count > len(cups):
+        successors[cups[-1]] = len(cups) + 1
+        successors[cup_count] = cups[0]
+    else:
+        successors[cups[-1]] = cups[0]
+
+    return successors
+
+
+def play_moves(successors: array, current_cup: int, moves: int) -> int:
+    """Play the given number of moves in place and return the new current cup.
+
+    Each move only relinks three successors, whatever the number of cups.
+    """
+    highest = len(successors) - 1
+
+    for _ in range(moves):
+        first = successors[current_cup]
+        second = successors[first]
+        third = successors[second]
+
+        destination_cup = current_cup - 1 or highest
+        while (
+            destination_cup == first
+            or destination_cup == second
+            or destination_cup == third
+        ):
+            destination_cup = destination_cup - 1 or highest
+
+        # Cut the picked up cups out and splice them in after the destination
+        successors[current_cup] = successors[third]
+        successors[third] = successors[destination_cup]
+        successors[destination_cup] = first
+
+        current_cup = successors[current_cup]
+
+    return current_cup
+
+
+def cups_after(successors: array, label: int, count: int) -> Tuple[int, ...]:
+    """Return the labels of the count cups clockwise of the given label."""
+    cups = []
+    for _ in range(count):
+        label = successors[label]
+        cups.append(label)
+
+    return tuple(cups)
+
+
+def make_n_moves(moves: int, cups: Sequence[int]) -> Tuple[int, ...]:
+    """Play the given moves and return the circle starting from the first cup."""
+    successors = build_successors(cups)
+    play_moves(successors, cups[0], moves)
+
+    return (cups[0],) + cups_after(successors, cups[0], len(cups) - 1)
+
+
+def snapshot_path(
+    snapshot_dir: str, cups: Sequence[int], cup_count: int, moves: Union[int, str]
+) -> str:
+    """Return the snapshot file name for the given starting cups, cup count and moves."""
+    seed = "-".join(str(cup) for cup in cups)
+    return os.path.join(snapshot_dir, f"{seed}.{cup_count}.{moves}.snap")
+
+
+def save_snapshot(path: str, successors: array, moves: int, current_cup: int):
+    """Write the successor table to a memory mapped snapshot file."""
+    table = memoryview(successors).cast("B")
+    size = SNAPSHOT_HEADER.size + len(table)
+
+    # Write to a temporary file first so readers never see a torn snapshot
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w+b") as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as mm:
+            SNAPSHOT_HEADER.pack_into(
+                mm, 0, SNAPSHOT_MAGIC, moves, current_cup, len(successors) - 1
+            )
+            mm[SNAPSHOT_HEADER.size :] = table
+            mm.flush()
+
+    os.replace(temp_path, path)
+
+
+@contextmanager
+def open_snapshot(path: str) -> Iterator[Snapshot]:
+    """Map a snapshot read only, its successors can be queried with cups_after without copying the table."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, moves, current_cup, cup_count = SNAPSHOT_HEADER.unpack_from(mm, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a day 23 snapshot")
+
+            table = memoryview(mm)[SNAPSHOT_HEADER.size :]
+            successors = table.cast("I")
+            try:
+                yield Snapshot(moves, current_cup, cup_count, successors)
+            finally:
+                # The map can't close while views of it are still exported
+                successors.release()
+                table.release()
+
+
+def load_snapshot(path: str) -> Tuple[int, int, array]:
+    """Return the (moves, current_cup, successors) state stored in path to resume a game."""
+    with open_snapshot(path) as snapshot:
+        successors = array("I", snapshot.successors.cast("B").tobytes())
+        return snapshot.moves, snapshot.current_cup, successors
+
+
+def list_snapshots(
+    snapshot_dir: str, cups: Sequence[int], cup_count: int
+) -> Tuple[Tuple[int, str], ...]:
+    """Return the (moves, path) of every snapshot of this game, in move order."""
+    snapshots = []
+    for path in glob.glob(snapshot_path(snapshot_dir, cups, cup_count, "*")):
+        snapshots.append((int(path.rsplit(".", 2)[1]), path))
+
+    return tuple(sorted(snapshots))
+
+
+def snapshotted_moves(
+    cups: Sequence[int],
+    cup_count: int,
+    moves: int,
+    snapshot_dir: str,
+    interval: int = SNAPSHOT_INTERVAL,
+) -> array:
+    """Play the game, resuming from the latest snapshot at or below moves and saving one every interval moves."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    played, path = 0, None
+    for snapshot_moves, snapshot in list_snapshots(snapshot_dir, cups, cup_count):
+        if snapshot_moves <= moves:
+            played, path = snapshot_moves, snapshot
+
+    if path:
+        played, current_cup, successors = load_snapshot(path)
+    else:
+        successors = build_successors(cups, cup_count)
+        current_cup = cups[0]
+
+    while played < moves:
+        next_moves = min(moves, (played // interval + 1) * interval)
+        current_cup = play_moves(successors, current_cup, next_moves - played)
+        played = next_moves
+
+        if played % interval == 0:
+            path = snapshot_path(snapshot_dir, cups, cup_count, played)
+            save_snapshot(path, successors, played, current_cup)
 
-    return cups
+    return successors
 
 
 if __name__ == "__main__":
-    cups = list(int(cup) for cup in "389125467")
+    filename = sys.argv[1]
+    # The cup and move counts for part 2 can be given after the filename
+    cup_count = int(sys.argv[2]) if len(sys.argv) > 2 else PART2_CUPS
+    moves = int(sys.argv[3]) if len(sys.argv) > 3 else PART2_MOVES
+    # Optionally snapshot the game to, and resume it from, the given directory
+    snapshot_dir = sys.argv[4] if len(sys.argv) > 4 else None
 
-    current_cup_idx = 0
+    cups = [int(cup) for cup in open(filename).read().strip()]
 
-    new_cups = make_n_moves(10, cups)
+    successors = build_successors(cups)
+    play_moves(successors, cups[0], PART1_MOVES)
+    labels = "".join(str(cup) for cup in cups_after(successors, 1, len(cups) - 1))
+    print(f"Part 1: {labels}")
 
-    #     *
-    # 3 2 5 4 6 7 8 9 1
-    # 3 2 5 8 9 1
-    # 7 2 5 8 9 1 3 4 6
+    start = time.perf_counter()
+    if snapshot_dir:
+        successors = snapshotted_moves(cups, cup_count, moves, snapshot_dir)
+    else:
+        successors = build_successors(cups, cup_count)
+        play_moves(successors, cups[0], moves)
+    first, second = cups_after(successors, 1, 2)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Part 2: {first * second} ({cup_count} cups, {moves} moves in {elapsed:.1f}s)"
+    )
 
-    print(f"{cups=}")
-    print(f"{new_cups=}")
\ No newline at end of file
+    if snapshot_dir:
+        for snapshot_moves, path in list_snapshots(snapshot_dir, cups, cup_count):
+            with open_snapshot(path) as snapshot:
+                after_one = cups_after(snapshot.successors, 1, 2)
+            print(f"Move {snapshot_moves}: cups after 1 {after_one}")
@@ -2,11 +2,21 @@ from os import DirEntry
 import sys
 from collections import defaultdict, Counter
 from pprint import pprint
-from typing import Generator, Tuple
-
+from typing import Generator, Tuple, Iterable, Set
 
 VALID_DIRECTIONS = ("e", "w", "ne", "nw", "se", "sw")
 
+# Tiles are packed into a single int key as (q + offset) << bits | (r + offset)
+TILE_BITS = 32
+TILE_OFFSET = 1 << (TILE_BITS - 1)
+TILE_MASK = (1 << TILE_BITS) - 1
+
+# Axial (q, r) steps for e, w, ne, nw, se, sw as deltas of a packed key
+NEIGHBOR_DELTAS = tuple(
+    (dq << TILE_BITS) + dr
+    for dq, dr in ((1, 0), (-1, 0), (1, -1), (0, -1), (0, 1), (-1, 1))
+)
+
 
 def parse_directions(lines):
     all_directions = []
@@ -106,6 +116,57 @@ def get_destination_coords(path_to_tile):
     return (x, y)
 
 
+def path_coords(path: bytes) -> Tuple[int, int]:
+    """Return the axial (q, r) coordinates at the end of the given path.
+
+    Every n or s starts a two letter direction, so each digraph can be counted on its own:
+    e and w move q except after s and n respectively, and n and s alone move r.
+    """
+    q = path.count(b"e") - path.count(b"w") - path.count(b"se") + path.count(b"nw")
+    r = path.count(b"s") - path.count(b"n")
+
+    return q, r
+
+
+def pack_tile(q: int, r: int) -> int:
+    """Pack axial coordinates into a single int key."""
+    return (q + TILE_OFFSET) << TILE_BITS | (r + TILE_OFFSET)
+
+
+def unpack_tile(key: int) -> Tuple[int, int]:
+    """Return the axial coordinates of a packed key."""
+    return (key >> TILE_BITS) - TILE_OFFSET, (key & TILE_MASK) - TILE_OFFSET
+
+
+def flip_tiles(paths: Iterable[bytes]) -> Set[int]:
+    """Flip the tile at the end of each path and return the packed keys of the black tiles."""
+    black: Set[int] = set()
+
+    for path in paths:
+        path = path.rstrip()
+        if not path:
+            continue
+
+        key = pack_tile(*path_coords(path))
+        if key in black:
+            black.remove(key)
+        else:
+            black.add(key)
+
+    return black
+
+
+def flip_day(black: Set[int]) -> Set[int]:
+    """Return the black tiles after one day of flipping."""
+    black_neighbors = Counter(key + delta for key in black for delta in NEIGHBOR_DELTAS)
+
+    return {
+        key
+        for key, count in black_neighbors.items()
+        if count == 2 or (count == 1 and key in black)
+    }
+
+
 def get_neighbors(point: Tuple[int, int]) -> Generator:
     """Generate the coordinates for each tile adjacent to the given point."""
     x, y = point
@@ -151,36 +212,13 @@ def set_initial_floor(directions):
 
 if __name__ == "__main__":
     filename = sys.argv[1]
-    contents = open(filename).readlines()
-    directions = parse_directions(contents)
-
-    floor = set_initial_floor(directions)
-
-    tile_count = Counter(floor.values())
-    print(f"Part 1 Black Tiles: {tile_count[True]} White Tiles: {tile_count[False]}")
-
-    # point = (0, -2 - 2j)
-    # for neighbor in get_neighbors(point):
-    #     print(f"{neighbor=}")
-    # black_neighbors = count_neighbors_complex(floor, point)
-    # print(f"{point=} black:{black_neighbors}")
-
-    for _ in range(1, 3):
-        new_floor = floor.copy()
-        for point, state in floor.items():
-            black_neighbors = count_neighbors(floor, point)
-
-            # Black tiles
-            if floor[point]:
-                if black_neighbors == 0 or black_neighbors > 2:
-                    new_floor[point] = not floor[point]
-            # White tiles
-            else:
-                if black_neighbors == 2:
-                    new_floor[point] = not floor[point]
-
-        floor = new_floor.copy()
-        tile_count = Counter(floor.values())
-        print(
-            f"{_} days Black Tiles: {tile_count[True]} White Tiles: {tile_count[False]}"
-        )
+
+    with open(filename, "rb") as f:
+        black = flip_tiles(f)
+
+    print(f"Part 1 Black Tiles: {len(black)}")
+
+    for _ in range(100):
+        black = flip_day(black)
+
+    print(f"Part 2 Black Tiles after 100 days: {len(black)}")